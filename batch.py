@@ -0,0 +1,134 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import multiprocessing
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pygame
+
+from benchmark import summarize
+from test import Game, KeyState, ScriptedInput, autorun_script, TICK_RATE, OWNER_PLAYER
+
+MAX_TICKS = TICK_RATE * 300
+THREAT_RADIUS = 160
+GRENADE_RANGE = 500
+
+
+class BotInput:
+    # Reacts to the world: push right firing, hop obstacles, shield against close fire, lob grenades at crowds
+    def __init__(self, game):
+        self.game = game
+        self.tick = 0
+
+    def poll(self):
+        game = self.game
+        player = game.player
+        held = {pygame.K_RIGHT, pygame.K_f}
+        pressed = [pygame.K_f] if self.tick % 12 == 0 else []
+        self.tick += 1
+
+        probe = SimpleNamespace(rect=player.rect.move(40, -5))
+        if game.platform_grid.spritecollide(probe):
+            held.add(pygame.K_SPACE)
+
+        store = game.projectiles
+        hostile = store.alive & (store.owner != OWNER_PLAYER)
+        if hostile.any():
+            dist = np.hypot(store.x[hostile] - player.rect.centerx, store.y[hostile] - player.rect.centery)
+            if dist.min() < THREAT_RADIUS and player.shield > 20:
+                held.add(pygame.K_c)
+
+        x = player.rect.centerx
+        near = sum(1 for e in game.enemies if 0 < e.rect.centerx - x < GRENADE_RANGE)
+        if near >= 2 or game.boss_group:
+            held.add(pygame.K_g)
+        return KeyState(held), pressed
+
+
+POLICIES = {
+    "bot": BotInput,
+    "scripted": lambda game: ScriptedInput(autorun_script),
+}
+
+_game = None
+
+
+def init_worker():
+    # One headless game per process, reset for every run
+    global _game
+    _game = Game(headless=True)
+
+
+def run_one(job):
+    seed, policy, max_ticks, boss_score = job
+    game = _game
+    game.new_game(seed)
+    if boss_score is not None:
+        game.next_boss_score = boss_score
+    result = game.run_headless(POLICIES[policy](game), max_ticks)
+    return {
+        "seed": seed,
+        "policy": policy,
+        "ticks": result["ticks"],
+        "survival_s": round(result["ticks"] / TICK_RATE, 3),
+        "died": result["game_over"],
+        "score": result["score"],
+        "distance": round(result["distance"]),
+        "boss_kills": game.boss_kills,
+        "ms_per_tick": round(result["seconds"] / result["ticks"] * 1e3, 4) if result["ticks"] else None,
+    }
+
+
+def aggregate(rows):
+    return {
+        "runs": len(rows),
+        "score": summarize([r["score"] for r in rows]),
+        "survival_s": summarize([r["survival_s"] for r in rows]),
+        "death_rate": round(sum(r["died"] for r in rows) / len(rows), 4),
+        "boss_kill_rate": round(sum(r["boss_kills"] > 0 for r in rows) / len(rows), 4),
+        "ms_per_tick": summarize([r["ms_per_tick"] for r in rows if r["ms_per_tick"] is not None]),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run many headless games in parallel and aggregate the outcomes")
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1, help="first seed, runs use seed, seed+1, ...")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="bot")
+    parser.add_argument("--max-ticks", type=int, default=MAX_TICKS, help="cap on ticks per run")
+    parser.add_argument("--boss-score", type=int, help="override the score the first boss appears at")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes (default: all cores)")
+    parser.add_argument("--out", default="batch.jsonl", help="one JSON line per finished run, written as runs finish")
+    parser.add_argument("--json", help="write the aggregate to this file")
+    args = parser.parse_args()
+
+    jobs = [(args.seed + i, args.policy, args.max_ticks, args.boss_score) for i in range(args.runs)]
+    rows = []
+    start = time.perf_counter()
+    with open(args.out, "w") as out, multiprocessing.Pool(args.workers, initializer=init_worker) as pool:
+        for row in pool.imap_unordered(run_one, jobs, chunksize=max(1, args.runs // (args.workers * 8))):
+            out.write(json.dumps(row) + "\n")
+            out.flush()
+            rows.append(row)
+            if len(rows) % 50 == 0:
+                print(f"{len(rows)}/{args.runs} runs, {time.perf_counter() - start:.1f}s")
+        # Let workers exit on their own: pygame catches SIGTERM, so terminate() can wait on them forever
+        pool.close()
+        pool.join()
+
+    report = aggregate(rows)
+    report.update(policy=args.policy, seed=args.seed, workers=args.workers,
+                  wall_s=round(time.perf_counter() - start, 2))
+    score, survival, tick = report["score"], report["survival_s"], report["ms_per_tick"]
+    print(f"{report['runs']} runs on {args.workers} workers in {report['wall_s']}s  "
+          f"score mean/p95 {score['mean']:.0f}/{score['p95']:.0f}  survival mean {survival['mean']:.1f}s  "
+          f"deaths {report['death_rate']:.0%}  boss kills {report['boss_kill_rate']:.0%}  "
+          f"tick ms mean/p99 {tick['mean']:.3f}/{tick['p99']:.3f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,398 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+import pygame
+
+from test import (ASSETS, Game, KeyState, Soldier, Tank, Helicopter, Explosion, Missile, SpatialGroup, RENDERERS,
+                  SCREEN_WIDTH, SCREEN_HEIGHT, DT, ORANGE, YELLOW, CHUNK_BUILD_BUDGET_MS, MISSILE_ROTATION_STEP)
+
+DISTANCES = [10000, 50000, 100000, 200000]
+QUERIES = 20000
+SPATIAL_TRIALS = 500
+CROWDS = [8, 32, 128]
+EXPLOSIONS = 24
+
+RUN_KEYS = KeyState({pygame.K_RIGHT, pygame.K_SPACE, pygame.K_f})
+FIRE_KEYS = KeyState({pygame.K_f})
+
+
+class FrameTimer:
+    def __init__(self):
+        self.update_ms = []
+        self.draw_ms = []
+        self.peak = {}
+
+    def step(self, game, keys, draw=True):
+        start = time.perf_counter()
+        game.step(keys)
+        mid = time.perf_counter()
+        self.update_ms.append((mid - start) * 1e3)
+        if draw:
+            # Rendered frames also build ahead, as run() does
+            game.draw()
+            game.build_ahead(CHUNK_BUILD_BUDGET_MS / 1000)
+            self.draw_ms.append((time.perf_counter() - mid) * 1e3)
+        self.sample(game)
+
+    def sample(self, game):
+        counts = {
+            "all_sprites": len(game.all_sprites),
+            "platforms": len(game.platforms),
+            "enemies": len(game.enemies),
+            "projectiles": len(game.projectiles),
+            "missiles": len(game.missiles),
+            "grenades": len(game.grenades) + len(game.enemy_grenades),
+            "items": len(game.items),
+            "effects": len(game.effects),
+        }
+        for name, count in counts.items():
+            self.peak[name] = max(self.peak.get(name, 0), count)
+
+    def result(self, game, **extra):
+        return {
+            "ticks": len(self.update_ms),
+            "render": game.renderer.stats(),
+            "view": game.view.stats(),
+            "hud": game.hud.stats(),
+            "assets": ASSETS.stats(),
+            "lifecycle": game.lifecycle.stats(),
+            # Sprite pools are class-wide, so their counters run on across the scenarios of one invocation
+            "pools": game.pool_stats(),
+            "missile_rotations": Missile.rotations.stats() if Missile.rotations else None,
+            "update_ms": summarize(self.update_ms),
+            "draw_ms": summarize(self.draw_ms),
+            "peak_sprites": self.peak,
+            **extra,
+        }
+
+
+def summarize(samples):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+    return {
+        "mean": round(sum(ordered) / len(ordered), 4),
+        "p95": round(pct(0.95), 4),
+        "p99": round(pct(0.99), 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+def prepare(game, seed):
+    game.new_game(seed)
+    game.renderer = type(game.renderer)(game.view.canvas, present=False, output=game.screen)
+    # Keep the scripted player alive and out of boss fights unless a scenario wants one
+    game.next_boss_score = float("inf")
+
+
+def god_mode(game):
+    game.player.hp = game.player.max_hp
+
+
+def scenario_long_run(game, scale, seed):
+    prepare(game, seed)
+    timer = FrameTimer()
+    target = int(100000 * scale)
+    ticks = 0
+    while game.player.rect.x < target:
+        god_mode(game)
+        timer.step(game, RUN_KEYS, draw=ticks % 8 == 0)
+        ticks += 1
+    return timer.result(game, distance=game.player.rect.x, chunks=game.chunks.stats())
+
+
+def fill_crowd(game, size):
+    base_x = game.player.rect.x
+    ground_y = SCREEN_HEIGHT - 60
+    while len(game.enemies) < size:
+        i = len(game.enemies)
+        x = base_x + 150 + (i * 37) % 900
+        kind = i % 4
+        if kind < 2:
+            e = Soldier(x, ground_y, game.rng)
+        elif kind == 2:
+            e = Tank(x, ground_y, game.rng)
+        else:
+            e = Helicopter(x, 150 + (i * 13) % 200, game.rng)
+        game.enemies.add(e)
+        game.all_sprites.add(e)
+
+
+def scenario_hmg_crowd(game, scale, seed, crowd=60):
+    prepare(game, seed)
+    timer = FrameTimer()
+    for i in range(int(3000 * scale)):
+        god_mode(game)
+        game.player.weapon_type = "hmg"
+        game.player.ammo = 100
+        fill_crowd(game, crowd)
+        timer.step(game, FIRE_KEYS)
+    return timer.result(game, crowd=crowd)
+
+
+def scenario_boss_fight(game, scale, seed):
+    prepare(game, seed)
+    game.next_boss_score = 0
+    timer = FrameTimer()
+    boss_killed = False
+    for i in range(int(4000 * scale)):
+        god_mode(game)
+        game.player.weapon_type = "hmg"
+        game.player.ammo = 100
+        for boss in game.boss_group:
+            # Attack every tick so missiles and bombs stay at their peak
+            boss.attack_cooldown = 0
+        timer.step(game, FIRE_KEYS)
+        if i > 0 and not game.boss_group:
+            boss_killed = True
+            break
+    return timer.result(game, boss_killed=boss_killed)
+
+
+def scenario_explosions(game, scale, seed, count=50):
+    prepare(game, seed)
+    timer = FrameTimer()
+    for wave in range(max(1, int(10 * scale))):
+        for i in range(count):
+            x = int(game.camera_x) + 100 + (i * 97) % (SCREEN_WIDTH - 200)
+            y = 200 + (i * 53) % (SCREEN_HEIGHT - 400)
+            expl = Explosion.pool.acquire(x, y)
+            game.all_sprites.add(expl)
+            game.effects.add(expl)
+        while game.effects:
+            god_mode(game)
+            timer.step(game, KeyState())
+    return timer.result(game, explosions=count)
+
+
+SCENARIOS = {
+    "long_run": scenario_long_run,
+    "hmg_crowd": scenario_hmg_crowd,
+    "boss_fight": scenario_boss_fight,
+    "explosions": scenario_explosions,
+}
+
+
+def build_world(game, distance):
+    # Keep every chunk resident so the brute-force path sees the whole run
+    random.seed(1)
+    game.new_game(1)
+    while game.world_limit < distance:
+        game.generate_chunk()
+
+
+def time_queries(collide, probes):
+    start = time.perf_counter()
+    for probe in probes:
+        collide(probe)
+    return (time.perf_counter() - start) / len(probes) * 1e6
+
+
+def bench_platform_collision(game):
+    results = []
+    for distance in DISTANCES:
+        build_world(game, distance)
+        probes = []
+        for i in range(QUERIES):
+            probe = Soldier(distance - random.randint(0, 2400), SCREEN_HEIGHT - 60 + random.randint(-100, 20))
+            probes.append(probe)
+
+        for probe in probes[:500]:
+            brute = pygame.sprite.spritecollide(probe, game.platforms, False)
+            assert brute == game.platform_grid.spritecollide(probe)
+
+        brute_us = time_queries(lambda p: pygame.sprite.spritecollide(p, game.platforms, False), probes)
+        grid_us = time_queries(game.platform_grid.spritecollide, probes)
+        results.append({
+            "distance": distance,
+            "platforms": len(game.platforms),
+            "brute_us": round(brute_us, 3),
+            "grid_us": round(grid_us, 3),
+        })
+    return results
+
+
+def random_population(rng, count, width):
+    sprites = []
+    for _ in range(count):
+        s = pygame.sprite.Sprite()
+        s.rect = pygame.Rect(rng.randint(-200, width), rng.randint(0, SCREEN_HEIGHT),
+                             rng.choice([16, 40, 160]), rng.choice([16, 40, 100]))
+        sprites.append(s)
+    return sprites
+
+
+def check_spatial_group(rng):
+    # SpatialGroup queries must match pygame's, hits and order, after members move and get refiled
+    for _ in range(SPATIAL_TRIALS):
+        group = SpatialGroup()
+        group.add(random_population(rng, rng.randint(0, 60), 6000))
+        others = pygame.sprite.Group(random_population(rng, rng.randint(0, 12), 6000))
+        moved = [s for s in group if rng.random() < 0.3]
+        for s in moved:
+            s.rect.x += rng.randint(-700, 700)
+        group.refile(moved)
+        for s in group.sprites()[::7]:
+            s.kill()
+        assert (list(group.groupcollide(others).items()) ==
+                list(pygame.sprite.groupcollide(group, others, False, False).items()))
+        for probe in others:
+            assert group.collide_rect(probe.rect) == pygame.sprite.spritecollide(probe, group, False)
+
+
+def bench_spatial_collision():
+    rng = random.Random(1)
+    check_spatial_group(rng)
+    results = []
+    for crowd in CROWDS:
+        # A resident crowd spread over a few screens against a handful of grenades, as in Game.update
+        group = SpatialGroup()
+        group.add(random_population(rng, crowd, SCREEN_WIDTH * 3))
+        grenades = pygame.sprite.Group(random_population(rng, 8, SCREEN_WIDTH * 3))
+        passes = max(200, QUERIES // crowd)
+        start = time.perf_counter()
+        for _ in range(passes):
+            pygame.sprite.groupcollide(group, grenades, False, False)
+        brute_us = (time.perf_counter() - start) / passes * 1e6
+        start = time.perf_counter()
+        for _ in range(passes):
+            group.groupcollide(grenades)
+        spatial_us = (time.perf_counter() - start) / passes * 1e6
+        results.append({"crowd": crowd, "brute_us": round(brute_us, 3), "spatial_us": round(spatial_us, 3)})
+    return results
+
+
+class RedrawExplosion(pygame.sprite.Sprite):
+    # The pre-cache Explosion: one 300x300 surface per instance, redrawn every tick
+    def __init__(self, x, y):
+        super().__init__()
+        self.radius = 10
+        self.max_radius = 150
+        self.image = pygame.Surface((self.max_radius*2, self.max_radius*2), pygame.SRCALPHA)
+        self.rect = self.image.get_rect(center=(x, y))
+        self.alpha = 255
+        self.timer = 20
+
+    def update(self):
+        self.timer -= 1 * DT
+        if self.radius < self.max_radius:
+            self.radius += 15 * DT
+        if self.timer < 10:
+            self.alpha -= 25 * DT
+            if self.alpha < 0: self.alpha = 0
+        self.image.fill((0,0,0,0))
+        pygame.draw.circle(self.image, (*ORANGE, int(self.alpha)), (self.max_radius, self.max_radius), int(self.radius))
+        pygame.draw.circle(self.image, (*YELLOW, int(self.alpha)), (self.max_radius, self.max_radius), int(self.radius * 0.7))
+        if self.timer <= 0:
+            self.kill()
+
+
+def run_explosions(screen, make):
+    group = pygame.sprite.Group()
+    for i in range(EXPLOSIONS):
+        group.add(make(100 + (i * 80) % (SCREEN_WIDTH - 200), 300 + (i // 20) * 300))
+    frames = 0
+    start = time.perf_counter()
+    while group:
+        group.update()
+        for s in group:
+            screen.blit(s.image, s.rect)
+        frames += 1
+    return (time.perf_counter() - start) / frames * 1e3
+
+
+def bench_explosions(screen):
+    Explosion.bake_frames()
+    redraw_ms = run_explosions(screen, RedrawExplosion)
+    baked_ms = run_explosions(screen, Explosion.pool.acquire)
+    return {
+        "explosions": EXPLOSIONS,
+        "redraw_ms_per_frame": round(redraw_ms, 3),
+        "baked_ms_per_frame": round(baked_ms, 3),
+        "baked_cache_bytes": Explosion.frame_bytes(),
+    }
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_scenario(name, r):
+    upd, drw = r["update_ms"], r["draw_ms"] or {}
+    print(f"{name:<12} ticks {r['ticks']:>6}  update ms mean/p95/p99 "
+          f"{upd['mean']:.3f}/{upd['p95']:.3f}/{upd['p99']:.3f}  draw ms mean/p95/p99 "
+          f"{drw.get('mean', 0):.3f}/{drw.get('p95', 0):.3f}/{drw.get('p99', 0):.3f}  "
+          f"peak sprites {r['peak_sprites']['all_sprites']} projectiles {r['peak_sprites']['projectiles']}  "
+          f"px/frame {r['render']['pixels_per_frame']:.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Game loop benchmark suite")
+    parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                        help=f"scenarios to run, any of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--scale", type=float, default=1.0, help="scale scenario lengths")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    parser.add_argument("--renderer", choices=sorted(RENDERERS), default="full",
+                        help="dirty only saves work on frames where the camera holds still")
+    parser.add_argument("--render-scale", type=float, default=1.0,
+                        help="internal resolution as a share of the window, e.g. 0.5 for 960x540")
+    parser.add_argument("--rotation-step", type=float, default=MISSILE_ROTATION_STEP,
+                        help="degrees between cached missile images")
+    parser.add_argument("--micro", action="store_true", help="also run the collision and explosion micro-benchmarks")
+    args = parser.parse_args()
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name!r}")
+
+    Missile.set_rotation_step(args.rotation_step)
+    game = Game(headless=True, renderer=args.renderer, render_scale=args.render_scale)
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "seed": args.seed,
+        "scale": args.scale,
+        "renderer": args.renderer,
+        "render_scale": args.render_scale,
+        "rotation_step": args.rotation_step,
+        "scenarios": {},
+    }
+    for name in args.scenarios or SCENARIOS:
+        result = SCENARIOS[name](game, args.scale, args.seed)
+        report["scenarios"][name] = result
+        print_scenario(name, result)
+
+    if args.micro:
+        print(f"{'distance':>10} {'platforms':>10} {'brute us':>10} {'grid us':>10}")
+        report["platform_collision"] = bench_platform_collision(game)
+        for r in report["platform_collision"]:
+            print(f"{r['distance']:>10} {r['platforms']:>10} {r['brute_us']:>10} {r['grid_us']:>10}")
+        print(f"{'crowd':>10} {'brute us':>10} {'spatial us':>10}   (groupcollide vs 8 grenades)")
+        report["spatial_collision"] = bench_spatial_collision()
+        for r in report["spatial_collision"]:
+            print(f"{r['crowd']:>10} {r['brute_us']:>10} {r['spatial_us']:>10}")
+        r = report["explosion_cache"] = bench_explosions(game.screen)
+        print(f"{r['explosions']} explosions: redraw {r['redraw_ms_per_frame']} ms/frame, "
+              f"baked {r['baked_ms_per_frame']} ms/frame ({r['baked_cache_bytes'] // 1024} KiB shared cache)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    pygame.quit()
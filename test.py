@@ -1,15 +1,70 @@
 import pygame
 import sys
+import time
+import argparse
+import csv
+import json
+import struct
+import zlib
+import hashlib
+import sqlite3
+import threading
+import queue
+from datetime import datetime, timezone
+from collections import deque
 import random
 import math
 import os 
+import weakref
+import tracemalloc
+import numpy as np
 
 # Config
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
 SCREEN_WIDTH = 1920
 SCREEN_HEIGHT = 1080
-FPS = 144
+FPS = 144 # render cap
+TICK_RATE = 144 # fixed simulation steps per second
+TICK_SECONDS = 1 / TICK_RATE
+MAX_CATCHUP_STEPS = 5
+DIRTY_FULL_RATIO = 0.5 # dirty renderer flips the whole screen above this share of changed pixels
+RENDER_SCALE_LEVELS = (1.0, 0.75, 2/3, 0.5) # internal resolutions dynamic mode steps between
+RENDER_SCALE_COOLDOWN = 60 # frames to hold a dynamic resolution level before changing again
+RENDER_SCALE_HEADROOM = 0.6 # step back up once frames take less than this share of the target
+QUALITY_BUDGET_MS = 1000 / FPS # update + draw time a frame may take before the governor steps quality down
+QUALITY_LEVELS = ( # explosion frame stride, simple melee effects, max render scale, enemy wake window in screens (behind, ahead)
+    (1, False, 1.0, (1.0, 1.5)),
+    (2, False, 1.0, (0.75, 1.25)),
+    (2, True, 0.75, (0.5, 1.0)),
+    (3, True, 0.5, (0.4, 0.8)),
+)
+QUALITY_HISTORY = 6 # level changes listed in the debug overlay
+HUD_LAYER_HEIGHT = 140
+TEXT_CACHE_LIMIT = 256
+LEADERBOARD_PATH = "leaderboard.db"
+LEADERBOARD_SIZE = 10 # runs kept
+LEGACY_HIGHSCORE_PATH = "highscore.txt" # imported once into an empty leaderboard
+REPLAY_MAGIC = b"MSRP"
+REPLAY_VERSION = 3
+REPLAY_HEADER = struct.Struct("<4sBHII16s") # magic, version, tick rate, seed, ticks, final state hash
+PROFILE_WINDOW = 240 # frames kept for the profiler overlay
+TELEMETRY_INTERVAL = TICK_RATE # ticks between telemetry samples
+TELEMETRY_RING = 3600 # samples kept in memory, an hour at one per second
+TELEMETRY_FLUSH_EVERY = 10 # samples per append to the telemetry file
+TELEMETRY_TOP = 5 # tracemalloc allocators written with each append
 GRAVITY = 0.8
-DT = 60 / FPS 
+DT = 60 / TICK_RATE 
+CHUNK_UNLOAD_MARGIN = SCREEN_WIDTH
+FIRST_CHUNK_WIDTH = 1000
+CHUNK_WIDTH = 1200
+CHUNK_PLAN_AHEAD = 2 # layouts the planner thread keeps queued
+CHUNK_BUILD_BUDGET_MS = 1.0 # main-thread time per frame spent building the next chunk's sprites
+PLATFORM_CELL_SIZE = 256
+SPATIAL_CELL_SIZE = 512
+PROJECTILE_CAPACITY = 256
+PROJECTILE_CULL_MARGIN = SCREEN_WIDTH // 3 # px kept beyond either side of the camera view, covers every shooter's range
+PROJECTILE_TTL = TICK_RATE * 5 # ticks a bullet may live; missiles have their fuel and grenades their fuse
+MISSILE_ROTATION_STEP = 5 # degrees between cached missile images
 
 # Color
 WHITE = (255, 255, 255)
@@ -26,97 +81,461 @@ ORANGE = (255, 140, 0)
 PINK = (255, 105, 180)
 PURPLE = (128, 0, 128)
 SEMI_TRANSPARENT_BLACK = (0, 0, 0, 180)
-
-class Explosion(pygame.sprite.Sprite):
-    def __init__(self, x, y):
+TERRAIN_COLORKEY = (255, 0, 255)
+
+# Projectile owners
+OWNER_PLAYER = 0
+OWNER_ENEMY = 1
+OWNER_BOSS = 2
+PROJECTILE_CAPS = { # live projectiles kept per type and owner, the oldest go first
+    "bullet": {OWNER_PLAYER: 96, OWNER_ENEMY: 64, OWNER_BOSS: 128},
+    "missile": {OWNER_ENEMY: 12, OWNER_BOSS: 24},
+    "grenade": {OWNER_PLAYER: 8, OWNER_BOSS: 24},
+}
+
+class SpritePool:
+    def __init__(self, cls):
+        self.cls = cls
+        self.free = []
+        self.live = 0
+        self.hits = 0
+        self.misses = 0
+        self.high_water = 0
+
+    def acquire(self, *args, **kwargs):
+        if self.free:
+            obj = self.free.pop()
+            obj.reset(*args, **kwargs)
+            self.hits += 1
+        else:
+            obj = self.cls(*args, **kwargs)
+            self.misses += 1
+        obj.released = False
+        obj.generation += 1
+        self.live += 1
+        if self.live > self.high_water:
+            self.high_water = self.live
+        return obj
+
+    def release(self, obj):
+        self.free.append(obj)
+        self.live -= 1
+
+    def stats(self):
+        return {"live": self.live, "free": len(self.free), "hits": self.hits,
+                "misses": self.misses, "high_water": self.high_water}
+
+class PooledSprite(pygame.sprite.Sprite):
+    # Instances come from cls.pool.acquire() and go back to it on kill()
+    pool = None
+    generation = 0 # bumped on every acquire, so a reused instance is not mistaken for its previous life
+
+    def __init__(self, *args, **kwargs):
         super().__init__()
-        self.radius = 10
-        self.max_radius = 150 
-        self.growth_rate = 15
+        self.released = False
+        self.reset(*args, **kwargs)
+
+    def kill(self):
+        super().kill()
+        if self.pool is not None and not self.released:
+            self.released = True
+            self.pool.release(self)
+
+class Explosion(PooledSprite):
+    # Every explosion follows the same radius/alpha curve, so its frames are drawn once and shared
+    frames = None
+    blank = None
+    stride = 1 # frames advanced per tick, raised by the quality governor
+
+    @classmethod
+    def bake_frames(cls):
+        max_radius = 150
+        canvas = pygame.Surface((max_radius*2, max_radius*2), pygame.SRCALPHA)
+        radius = 10
+        alpha = 255
+        timer = 20
+        frames = []
+        while True:
+            timer -= 1 * DT
+            if radius < max_radius:
+                radius += 15 * DT
+            if timer < 10:
+                alpha -= 25 * DT
+                if alpha < 0: alpha = 0
+            if timer <= 0:
+                break
+
+            canvas.fill((0,0,0,0)) 
+            pygame.draw.circle(canvas, (*ORANGE, int(alpha)), 
+                               (max_radius, max_radius), int(radius))
+            pygame.draw.circle(canvas, (*YELLOW, int(alpha)), 
+                               (max_radius, max_radius), int(radius * 0.7))
+            # Keep only the painted area, offset from the explosion centre
+            area = canvas.get_bounding_rect()
+            frames.append((canvas.subsurface(area).copy(), area.x - max_radius, area.y - max_radius))
+        cls.frames = frames
+        cls.blank = pygame.Surface((0, 0), pygame.SRCALPHA)
+        return frames
+
+    @classmethod
+    def frame_bytes(cls):
+        frames = cls.frames or cls.bake_frames()
+        return sum(img.get_bytesize() * img.get_width() * img.get_height() for img, _, _ in frames)
+
+    def reset(self, x, y):
+        if Explosion.frames is None:
+            Explosion.bake_frames()
         self.pos_x = x
         self.pos_y = y
-        
-        self.image = pygame.Surface((self.max_radius*2, self.max_radius*2), pygame.SRCALPHA)
+        self.frame = 0
+        self.image = Explosion.blank
         self.rect = self.image.get_rect(center=(x, y))
-        self.alpha = 255
-        self.timer = 20
 
     def update(self):
-        self.timer -= 1 * DT
-        
-        if self.radius < self.max_radius:
-            self.radius += self.growth_rate * DT
-        
-        if self.timer < 10:
-            self.alpha -= 25 * DT
-            if self.alpha < 0: self.alpha = 0
-            
-        self.image.fill((0,0,0,0)) 
-        
-        pygame.draw.circle(self.image, (*ORANGE, int(self.alpha)), 
-                           (self.max_radius, self.max_radius), int(self.radius))
-        
-        pygame.draw.circle(self.image, (*YELLOW, int(self.alpha)), 
-                           (self.max_radius, self.max_radius), int(self.radius * 0.7))
-        
-        if self.timer <= 0:
+        frames = Explosion.frames
+        if self.frame >= len(frames):
             self.kill()
-
-class Bullet(pygame.sprite.Sprite):
-    def __init__(self, x, y, dx, dy, damage=10, is_enemy=False, is_hmg=False, bullet_img=None, miss_callback=None):
-        super().__init__()
-        if bullet_img:
-            self.image = bullet_img
+            return
+        self.image, off_x, off_y = frames[self.frame]
+        self.frame += Explosion.stride
+        self.rect = self.image.get_rect(topleft=(self.pos_x + off_x, self.pos_y + off_y))
+
+class ProjectileStore:
+    # Struct-of-arrays bullets: one slot per live projectile, integrated, culled and collided in bulk
+    def __init__(self, miss_callback=None, capacity=PROJECTILE_CAPACITY):
+        self.miss_callback = miss_callback
+        self.images = []
+        self.image_ids = {}
+        self.kind_pistol = self.register_image(self.make_image((12, 12), YELLOW))
+        self.kind_hmg = self.register_image(self.make_image((14, 8), GOLD))
+        self.kind_enemy = self.register_image(self.make_image((12, 12), RED))
+
+        self.capacity = 0
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.vx = np.zeros(0)
+        self.vy = np.zeros(0)
+        self.left = np.zeros(0, dtype=np.int64)
+        self.top = np.zeros(0, dtype=np.int64)
+        self.prev_left = np.zeros(0, dtype=np.int64)
+        self.prev_top = np.zeros(0, dtype=np.int64)
+        self.w = np.zeros(0, dtype=np.int64)
+        self.h = np.zeros(0, dtype=np.int64)
+        self.damage = np.zeros(0, dtype=np.int64)
+        self.owner = np.zeros(0, dtype=np.int8)
+        self.kind = np.zeros(0, dtype=np.int16)
+        self.seq = np.zeros(0, dtype=np.int64)
+        self.born = np.zeros(0, dtype=np.int64)
+        self.alive = np.zeros(0, dtype=bool)
+        self.free = []
+        self.live = 0
+        self.next_seq = 0
+        self.tick = 0
+        self.slot_hits = 0
+        self.slot_misses = 0
+        self.high_water = 0
+        self.grow(capacity)
+
+    def __len__(self):
+        return self.live
+
+    @staticmethod
+    def make_image(size, color):
+        image = pygame.Surface(size)
+        image.fill(color)
+        return image
+
+    def register_image(self, image):
+        kind = self.image_ids.get(id(image))
+        if kind is None:
+            kind = self.image_ids[id(image)] = len(self.images)
+            self.images.append(image)
+        return kind
+
+    def grow(self, capacity):
+        extra = capacity - self.capacity
+        for name in ("x", "y", "vx", "vy", "left", "top", "prev_left", "prev_top",
+                     "w", "h", "damage", "owner", "kind", "seq", "born", "alive"):
+            arr = getattr(self, name)
+            setattr(self, name, np.concatenate([arr, np.zeros(extra, dtype=arr.dtype)]))
+        self.free.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+
+    def spawn(self, x, y, dx, dy, damage=10, owner=OWNER_PLAYER, is_hmg=False, image=None):
+        if self.free:
+            self.slot_hits += 1
         else:
-            size = (14, 8) if is_hmg else (12, 12) 
-            color = GOLD if is_hmg else (RED if is_enemy else YELLOW)
-            self.image = pygame.Surface(size)
-            self.image.fill(color)
-            
-        self.rect = self.image.get_rect()
-        self.rect.center = (x, y)
-        
-        self.pos_x = float(x)
-        self.pos_y = float(y)
-        
-        self.speed = 10 if is_enemy else (20 if is_hmg else 15)
-        self.vel_x = dx * self.speed
-        self.vel_y = dy * self.speed
-        
-        self.damage = damage
-        self.is_enemy = is_enemy
-        self.miss_callback = miss_callback 
+            self.slot_misses += 1
+            self.grow(self.capacity * 2)
+        i = self.free.pop()
+        if image is not None:
+            kind = self.register_image(image)
+        elif owner != OWNER_PLAYER:
+            kind = self.kind_enemy
+        else:
+            kind = self.kind_hmg if is_hmg else self.kind_pistol
+        speed = 10 if owner != OWNER_PLAYER else (20 if is_hmg else 15)
+        w, h = self.images[kind].get_size()
+
+        self.x[i] = float(x)
+        self.y[i] = float(y)
+        self.vx[i] = dx * speed
+        self.vy[i] = dy * speed
+        self.w[i] = w
+        self.h[i] = h
+        self.left[i] = self.prev_left[i] = int(x) - w // 2
+        self.top[i] = self.prev_top[i] = int(y) - h // 2
+        self.damage[i] = damage
+        self.owner[i] = owner
+        self.kind[i] = kind
+        self.seq[i] = self.next_seq
+        self.born[i] = self.tick
+        self.alive[i] = True
+        self.next_seq += 1
+        self.live += 1
+        if self.live > self.high_water:
+            self.high_water = self.live
+        return i
+
+    def release(self, slots):
+        if len(slots) == 0:
+            return
+        self.alive[slots] = False
+        self.vx[slots] = 0
+        self.vy[slots] = 0
+        self.free.extend(sorted(slots.tolist(), reverse=True))
+        self.live -= len(slots)
 
     def update(self):
-        self.pos_x += self.vel_x * DT
-        self.pos_y += self.vel_y * DT
-        
-        self.rect.centerx = int(self.pos_x)
-        self.rect.centery = int(self.pos_y)
-        
-        # Logic Bullet Miss
-        if self.rect.right < -100 or self.rect.left > 100000:
-            if self.miss_callback and not self.is_enemy: 
-                self.miss_callback(5)
-            self.kill()
-            
-        if self.rect.y > SCREEN_HEIGHT + 100 or self.rect.y < -100:
-            if self.miss_callback and not self.is_enemy:
-                self.miss_callback(5)
-            self.kill()
+        self.tick += 1
+        if not self.live:
+            return
+        self.x += self.vx * DT
+        self.y += self.vy * DT
+        self.prev_left = self.left
+        self.prev_top = self.top
+        self.left = self.x.astype(np.int64) - self.w // 2
+        self.top = self.y.astype(np.int64) - self.h // 2
+
+    def retire(self, slots):
+        # Logic Bullet Miss: every player bullet that leaves without hitting costs 5
+        if self.miss_callback:
+            misses = int(np.count_nonzero(self.owner[slots] == OWNER_PLAYER))
+            if misses:
+                self.miss_callback(5 * misses)
+        self.release(slots)
+
+    def cull(self, keep_left, keep_right, max_age):
+        # Frees bullets outside keep_left..keep_right or the screen's height, and bullets older than max_age ticks
+        if not self.live:
+            return 0, 0
+        off_x = (self.left + self.w < keep_left) | (self.left > keep_right)
+        off_y = (self.top > SCREEN_HEIGHT + 100) | (self.top < -100)
+        culled = self.alive & (off_x | off_y)
+        expired = self.alive & ~culled & (self.tick - self.born > max_age)
+        dead = np.flatnonzero(culled | expired)
+        if len(dead) == 0:
+            return 0, 0
+        self.retire(dead)
+        return int(np.count_nonzero(culled)), int(np.count_nonzero(expired))
+
+    def evict_oldest(self, owner, cap):
+        idx = np.flatnonzero(self.alive & (self.owner == owner))
+        excess = len(idx) - cap
+        if excess <= 0:
+            return 0
+        self.retire(idx[np.argsort(self.seq[idx], kind="stable")[:excess]])
+        return excess
+
+    def candidates(self, from_player):
+        if from_player:
+            return np.flatnonzero(self.alive & (self.owner == OWNER_PLAYER))
+        return np.flatnonzero(self.alive & (self.owner != OWNER_PLAYER))
+
+    def collide_group(self, group, dokill_group=False, from_player=True):
+        # groupcollide(group, bullets, dokill_group, True) with bullet damages as the values
+        crashed = {}
+        if not group or not self.live:
+            return crashed
+        idx = self.candidates(from_player)
+        if len(idx) == 0:
+            return crashed
+        targets = group.sprites()
+        rects = np.array([(t.rect.left, t.rect.top, t.rect.right, t.rect.bottom) for t in targets], dtype=np.int64)
+        left = self.left[idx]
+        top = self.top[idx]
+        hit = ((left < rects[:, 2:3]) & (rects[:, 0:1] < left + self.w[idx]) &
+               (top < rects[:, 3:4]) & (rects[:, 1:2] < top + self.h[idx]))
+        any_hit = hit.any(axis=0)
+        if not any_hit.any():
+            return crashed
+        # A bullet is consumed by the first target in group order that it touches
+        first = hit.argmax(axis=0)[any_hit]
+        hit_idx = idx[any_hit]
+        for t in np.unique(first).tolist():
+            slots = hit_idx[first == t]
+            slots = slots[np.argsort(self.seq[slots], kind="stable")]
+            crashed[targets[t]] = self.damage[slots].tolist()
+            if dokill_group:
+                targets[t].kill()
+        self.release(hit_idx)
+        return crashed
+
+    def collide_sprite(self, sprite, from_player=False):
+        # spritecollide(sprite, bullets, True) returning the damages of the consumed bullets
+        if not self.live:
+            return []
+        idx = self.candidates(from_player)
+        r = sprite.rect
+        left = self.left[idx]
+        top = self.top[idx]
+        hit = (left < r.right) & (r.left < left + self.w[idx]) & (top < r.bottom) & (r.top < top + self.h[idx])
+        slots = idx[hit]
+        if len(slots) == 0:
+            return []
+        slots = slots[np.argsort(self.seq[slots], kind="stable")]
+        damages = self.damage[slots].tolist()
+        self.release(slots)
+        return damages
+
+    def stats(self):
+        return {"live": self.live, "free": len(self.free), "hits": self.slot_hits,
+                "misses": self.slot_misses, "high_water": self.high_water}
+
+    def counts(self):
+        owners = self.owner[self.alive]
+        return {
+            "player": int(np.count_nonzero(owners == OWNER_PLAYER)),
+            "enemy": int(np.count_nonzero(owners == OWNER_ENEMY)),
+            "boss": int(np.count_nonzero(owners == OWNER_BOSS)),
+        }
+
+    def draw(self, surface, camera_x, alpha=1.0, view=None):
+        if not self.live:
+            return []
+        left, top = self.left, self.top
+        if alpha < 1.0:
+            left = (self.prev_left + (left - self.prev_left) * alpha).astype(np.int64)
+            top = (self.prev_top + (top - self.prev_top) * alpha).astype(np.int64)
+        off_x = left - camera_x
+        visible = np.flatnonzero(self.alive & (off_x + self.w > -50) & (off_x < SCREEN_WIDTH + 50))
+        if len(visible) == 0:
+            return []
+        images = self.images
+        xs, ys = off_x[visible], top[visible]
+        if view is not None and view.scale != 1.0:
+            images = [view.image(image) for image in images]
+            xs = np.floor(xs * view.scale).astype(np.int64)
+            ys = np.floor(ys * view.scale).astype(np.int64)
+        return surface.blits([(images[k], (x, y)) for k, x, y in
+                              zip(self.kind[visible].tolist(), xs.tolist(), ys.tolist())])
+
+class RotationCache:
+    # Pre-rotated copies of one image, snapped to the nearest `step` degrees
+    def __init__(self, image, step):
+        self.image = image
+        self.step = step
+        self.slots = max(1, round(360 / step))
+        self.images = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, angle_deg):
+        key = round(angle_deg / self.step) % self.slots
+        image = self.images.get(key)
+        if image is None:
+            image = self.images[key] = pygame.transform.rotate(self.image, -key * self.step)
+            self.misses += 1
+        else:
+            self.hits += 1
+        return image
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "step": self.step,
+            "size": len(self.images),
+            "bytes": sum(img.get_bytesize() * img.get_width() * img.get_height() for img in self.images.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+class ProjectileLifecycle:
+    # Retires projectiles that leave the camera view (plus a margin) or outlive their TTL, and holds every
+    # owner under its cap per type by evicting its oldest shots. Player shots retired unhit still count as misses
+    def __init__(self, store, missiles, grenades, enemy_grenades, margin=PROJECTILE_CULL_MARGIN,
+                 ttl=PROJECTILE_TTL, caps=PROJECTILE_CAPS):
+        self.store = store
+        self.sprite_groups = {"missile": (missiles,), "grenade": (grenades, enemy_grenades)}
+        self.margin = margin
+        self.ttl = ttl
+        self.caps = caps
+        self.retired = {kind: {"culled": 0, "expired": 0, "evicted": 0} for kind in caps}
+
+    def update(self, camera_x):
+        keep_left = camera_x - self.margin
+        keep_right = camera_x + SCREEN_WIDTH + self.margin
+        store = self.store
+        culled, expired = store.cull(keep_left, keep_right, self.ttl)
+        retired = self.retired["bullet"]
+        retired["culled"] += culled
+        retired["expired"] += expired
+        for owner, cap in self.caps["bullet"].items():
+            retired["evicted"] += store.evict_oldest(owner, cap)
+
+        for kind, groups in self.sprite_groups.items():
+            retired = self.retired[kind]
+            by_owner = {}
+            for group in groups:
+                for s in group.sprites():
+                    if s.rect.right < keep_left or s.rect.left > keep_right:
+                        reason = "culled"
+                    elif s.expired():
+                        reason = "expired"
+                    else:
+                        # Groups iterate in insertion order, so each owner's list runs oldest first
+                        by_owner.setdefault(s.owner, []).append(s)
+                        continue
+                    s.miss()
+                    s.kill()
+                    retired[reason] += 1
+            for owner, shots in by_owner.items():
+                excess = len(shots) - self.caps[kind].get(owner, len(shots))
+                for s in shots[:max(0, excess)]:
+                    s.miss()
+                    s.kill()
+                    retired["evicted"] += 1
+
+    def stats(self):
+        live = {"bullet": len(self.store)}
+        for kind, groups in self.sprite_groups.items():
+            live[kind] = sum(len(group) for group in groups)
+        return {kind: {"live": live[kind], **retired} for kind, retired in self.retired.items()}
 
 class Missile(pygame.sprite.Sprite):
-    def __init__(self, x, y, target):
+    original_image = None
+    rotations = None
+
+    @classmethod
+    def set_rotation_step(cls, step):
+        if cls.original_image is None:
+            cls.original_image = pygame.Surface((24, 12), pygame.SRCALPHA)
+            pygame.draw.polygon(cls.original_image, CYAN, [(0,0), (24,6), (0,12)])
+            pygame.draw.circle(cls.original_image, RED, (2, 6), 3) 
+        cls.rotations = RotationCache(cls.original_image, step)
+
+    def __init__(self, x, y, target, owner=OWNER_ENEMY):
         super().__init__()
-        self.original_image = pygame.Surface((24, 12), pygame.SRCALPHA)
-        pygame.draw.polygon(self.original_image, CYAN, [(0,0), (24,6), (0,12)])
-        pygame.draw.circle(self.original_image, RED, (2, 6), 3) 
+        if Missile.rotations is None:
+            Missile.set_rotation_step(MISSILE_ROTATION_STEP)
         
         self.image = self.original_image
         self.rect = self.image.get_rect()
         self.rect.center = (x, y)
         
         self.target = target
+        self.owner = owner
         self.speed = 3.5    
         self.damage = 40    
         self.hp = 1
@@ -143,7 +562,7 @@ class Missile(pygame.sprite.Sprite):
             self.vel_x = math.cos(angle_rad) * self.speed
             self.vel_y = math.sin(angle_rad) * self.speed
             
-            self.image = pygame.transform.rotate(self.original_image, -angle_deg)
+            self.image = Missile.rotations.get(angle_deg)
             self.rect = self.image.get_rect(center=self.rect.center)
 
         self.pos_x += self.vel_x * DT
@@ -151,20 +570,23 @@ class Missile(pygame.sprite.Sprite):
         
         self.rect.centerx = int(self.pos_x)
         self.rect.centery = int(self.pos_y)
-        
-        if self.timer >= self.fuel_limit:
-            self.kill() 
 
-        if self.rect.x < -200 or self.rect.x > 100000:
-            self.kill()
+    def expired(self):
+        return self.timer >= self.fuel_limit
 
-class Grenade(pygame.sprite.Sprite):
-    def __init__(self, x, y, direction, is_enemy=False, miss_callback=None):
-        super().__init__()
-        self.image = pygame.Surface((16, 16))
+    def miss(self):
+        pass
+
+class Grenade(PooledSprite):
+    images = {}
+
+    def reset(self, x, y, direction, is_enemy=False, miss_callback=None):
         color = RED if is_enemy else ORANGE
-        self.image.fill(color)
-        pygame.draw.rect(self.image, WHITE, (4,4,8,8)) 
+        self.image = Grenade.images.get(color)
+        if self.image is None:
+            self.image = Grenade.images[color] = pygame.Surface((16, 16))
+            self.image.fill(color)
+            pygame.draw.rect(self.image, WHITE, (4,4,8,8)) 
         
         self.rect = self.image.get_rect()
         self.rect.center = (x, y)
@@ -177,6 +599,7 @@ class Grenade(pygame.sprite.Sprite):
         self.timer = 60 
         self.explode_now = False
         self.is_enemy = is_enemy
+        self.owner = OWNER_BOSS if is_enemy else OWNER_PLAYER # only the boss drops grenades
         self.miss_callback = miss_callback # Grenade penalty miss
 
     def update(self):
@@ -193,15 +616,81 @@ class Grenade(pygame.sprite.Sprite):
             self.explode_now = True
             
         if self.rect.y > SCREEN_HEIGHT + 200:
-            if self.miss_callback and not self.is_enemy:
-                self.miss_callback(20) 
+            self.miss()
             self.kill()
 
+    def expired(self):
+        # The fuse ends every grenade in an explosion instead
+        return False
+
+    def miss(self):
+        if self.miss_callback and not self.is_enemy:
+            self.miss_callback(20)
+
+class AssetRegistry:
+    # Sprite images are built once, converted to the display format and shared by reference
+    def __init__(self):
+        self.images = {}
+        self.refs = {} # holders of each image that are still alive
+        self.fonts = {}
+
+    def image(self, key, build, holder=None, alpha=False):
+        image = self.images.get(key)
+        if image is None:
+            image = build()
+            if pygame.display.get_surface() is not None:
+                image = image.convert_alpha() if alpha else image.convert()
+            self.images[key] = image
+            self.refs[key] = 0
+        if holder is not None:
+            self.refs[key] += 1
+            weakref.finalize(holder, self.release, key).atexit = False
+        return image
+
+    def release(self, key):
+        self.refs[key] -= 1
+
+    def filled(self, key, size, color, holder=None):
+        def build():
+            image = pygame.Surface(size)
+            image.fill(color)
+            return image
+        return self.image(key, build, holder)
+
+    def load(self, key, path, size, holder=None):
+        if key in self.images:
+            return self.image(key, None, holder)
+        if not os.path.exists(path):
+            return None
+        try:
+            raw = pygame.image.load(path)
+        except (pygame.error, OSError):
+            return None
+        return self.image(key, lambda: pygame.transform.scale(raw, size), holder, alpha=True)
+
+    def font(self, name, size, bold=False):
+        key = (name, size, bold)
+        font = self.fonts.get(key)
+        if font is None:
+            font = self.fonts[key] = pygame.font.SysFont(name, size, bold=bold)
+        return font
+
+    def stats(self):
+        sizes = {key: image.get_pitch() * image.get_height() for key, image in self.images.items()}
+        return {
+            "images": len(self.images),
+            "bytes": sum(sizes.values()),
+            "holders": sum(self.refs.values()),
+            # What one private surface per live holder would cost on top of the shared copies
+            "saved_bytes": sum(max(0, self.refs[key] - 1) * size for key, size in sizes.items()),
+        }
+
+ASSETS = AssetRegistry()
+
 class Item(pygame.sprite.Sprite):
-    def __init__(self, x, y, color, type_name):
+    def __init__(self, x, y, image, type_name):
         super().__init__()
-        self.image = pygame.Surface((25, 25))
-        self.image.fill(color)
+        self.image = image
         self.rect = self.image.get_rect()
         self.rect.center = (x, y)
         
@@ -215,7 +704,7 @@ class Item(pygame.sprite.Sprite):
         self.pos_y += self.vel_y * DT
         self.rect.centery = int(self.pos_y)
         
-        hits = pygame.sprite.spritecollide(self, platforms, False)
+        hits = platforms.spritecollide(self)
         for p in hits:
             if self.vel_y > 0:
                 self.rect.bottom = p.rect.top
@@ -224,33 +713,155 @@ class Item(pygame.sprite.Sprite):
 
 class HealthPack(Item):
     def __init__(self, x, y):
-        super().__init__(x, y, PINK, 'heal')
-        pygame.draw.rect(self.image, WHITE, (8, 4, 9, 17))
-        pygame.draw.rect(self.image, WHITE, (4, 8, 17, 9))
-        pygame.draw.rect(self.image, RED, (10, 6, 5, 13))
-        pygame.draw.rect(self.image, RED, (6, 10, 13, 5))
+        super().__init__(x, y, ASSETS.image("health_pack", HealthPack.build, self), 'heal')
+
+    @staticmethod
+    def build():
+        image = pygame.Surface((25, 25))
+        image.fill(PINK)
+        pygame.draw.rect(image, WHITE, (8, 4, 9, 17))
+        pygame.draw.rect(image, WHITE, (4, 8, 17, 9))
+        pygame.draw.rect(image, RED, (10, 6, 5, 13))
+        pygame.draw.rect(image, RED, (6, 10, 13, 5))
+        return image
 
 class MachineGunPickup(Item):
     def __init__(self, x, y):
-        super().__init__(x, y, GOLD, 'mg')
-        font = pygame.font.SysFont("Arial", 20, bold=True)
-        txt = font.render("M", True, BLACK)
-        self.image.blit(txt, (5, 2))
-
-class MeleeEffect(pygame.sprite.Sprite):
-    def __init__(self, x, y):
-        super().__init__()
-        self.image = pygame.Surface((60, 60), pygame.SRCALPHA)
-        pygame.draw.arc(self.image, (255, 255, 255), (0,0,60,60), 0, 3.14, 5)
+        super().__init__(x, y, ASSETS.image("mg_pickup", MachineGunPickup.build, self), 'mg')
+
+    @staticmethod
+    def build():
+        image = pygame.Surface((25, 25))
+        image.fill(GOLD)
+        txt = ASSETS.font("Arial", 20, bold=True).render("M", True, BLACK)
+        image.blit(txt, (5, 2))
+        return image
+
+class MeleeEffect(PooledSprite):
+    image = None
+    simple_image = None
+    simple = False # quality governor: thin colorkeyed arc, shown for half as long
+
+    def reset(self, x, y):
+        if MeleeEffect.image is None:
+            MeleeEffect.image = pygame.Surface((60, 60), pygame.SRCALPHA)
+            pygame.draw.arc(MeleeEffect.image, (255, 255, 255), (0,0,60,60), 0, 3.14, 5)
+            MeleeEffect.simple_image = pygame.Surface((60, 60))
+            MeleeEffect.simple_image.set_colorkey((0, 0, 0), pygame.RLEACCEL)
+            pygame.draw.arc(MeleeEffect.simple_image, (255, 255, 255), (0,0,60,60), 0, 3.14, 2)
+        self.image = MeleeEffect.simple_image if MeleeEffect.simple else MeleeEffect.image
         self.rect = self.image.get_rect()
         self.rect.center = (x, y)
-        self.timer = 15 
+        self.timer = 8 if MeleeEffect.simple else 15
 
     def update(self):
         self.timer -= 1 * DT
         if self.timer <= 0:
             self.kill()
 
+# Short-lived sprites are recycled instead of rebuilt
+Explosion.pool = SpritePool(Explosion)
+Grenade.pool = SpritePool(Grenade)
+MeleeEffect.pool = SpritePool(MeleeEffect)
+
+# Keys the simulation reads while held
+CONTROL_KEYS = (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN,
+                pygame.K_SPACE, pygame.K_c, pygame.K_g, pygame.K_f)
+
+class KeyState:
+    # Stand-in for pygame.key.get_pressed() built from a set of held keys
+    def __init__(self, held=()):
+        self.held = frozenset(held)
+
+    def __getitem__(self, key):
+        return key in self.held
+
+class ScriptedInput:
+    # script(tick) -> (held keys, keys pressed down this tick)
+    def __init__(self, script):
+        self.script = script
+        self.tick = 0
+
+    def poll(self):
+        held, pressed = self.script(self.tick)
+        self.tick += 1
+        return KeyState(held), list(pressed)
+
+def autorun_script(tick):
+    # Run right firing, hop every second and throw a grenade every two
+    held = {pygame.K_RIGHT, pygame.K_f}
+    if tick % 144 < 20:
+        held.add(pygame.K_SPACE)
+    if tick % 288 == 0:
+        held.add(pygame.K_g)
+    pressed = [pygame.K_f] if tick % 30 == 0 else []
+    return held, pressed
+
+def key_mask(keys):
+    mask = 0
+    for bit, key in enumerate(CONTROL_KEYS):
+        if keys[key]:
+            mask |= 1 << bit
+    return mask
+
+class InputRecorder:
+    # Per tick: CONTROL_KEYS held as one bitmask byte, then the keys pressed down that tick
+    def __init__(self, seed):
+        self.seed = seed
+        self.body = bytearray()
+        self.ticks = 0
+
+    def record(self, keys, pressed):
+        self.body += struct.pack("<BB", key_mask(keys), len(pressed))
+        if pressed:
+            self.body += struct.pack(f"<{len(pressed)}I", *pressed)
+        self.ticks += 1
+
+    def save(self, path, state_hash):
+        with open(path, "wb") as f:
+            f.write(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, TICK_RATE, self.seed, self.ticks, state_hash))
+            f.write(zlib.compress(bytes(self.body), 9))
+
+class Replay:
+    # Plays a recording back through the same poll() interface as ScriptedInput
+    def __init__(self, seed, inputs, state_hash):
+        self.seed = seed
+        self.inputs = inputs
+        self.state_hash = state_hash
+        self.tick = 0
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, tick_rate, seed, ticks, state_hash = REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f"{path} is not a version {REPLAY_VERSION} replay")
+        if tick_rate != TICK_RATE:
+            raise ValueError(f"{path} was recorded at {tick_rate} ticks/s, this build runs at {TICK_RATE}")
+        body = zlib.decompress(data[REPLAY_HEADER.size:])
+        states = {}
+        inputs = []
+        pos = 0
+        for _ in range(ticks):
+            mask, count = struct.unpack_from("<BB", body, pos)
+            pos += 2
+            pressed = list(struct.unpack_from(f"<{count}I", body, pos))
+            pos += 4 * count
+            keys = states.get(mask)
+            if keys is None:
+                keys = states[mask] = KeyState(k for bit, k in enumerate(CONTROL_KEYS) if mask >> bit & 1)
+            inputs.append((keys, pressed))
+        return cls(seed, inputs, state_hash)
+
+    def __len__(self):
+        return len(self.inputs)
+
+    def poll(self):
+        keys, pressed = self.inputs[self.tick]
+        self.tick += 1
+        return keys, pressed
+
 class Player(pygame.sprite.Sprite):
     def __init__(self, game_ref):
         super().__init__()
@@ -288,7 +899,7 @@ class Player(pygame.sprite.Sprite):
         self.melee_dmg = 50   
 
     def get_input(self, all_sprites, bullets, grenades, is_locked, camera_x):
-        keys = pygame.key.get_pressed()
+        keys = self.game_ref.keys
         
         if keys[pygame.K_c] and self.shield > 0:
             self.is_shielding = True
@@ -315,18 +926,18 @@ class Player(pygame.sprite.Sprite):
             self.on_ground = False
         
         if keys[pygame.K_g] and self.grenade_cd <= 0 and not self.is_shielding:
-            g = Grenade(self.rect.centerx, self.rect.centery, self.facing, miss_callback=self.game_ref.apply_miss_penalty)
+            g = Grenade.pool.acquire(self.rect.centerx, self.rect.centery, self.facing, miss_callback=self.game_ref.apply_miss_penalty)
             all_sprites.add(g)
             grenades.add(g)
             self.grenade_cd = self.max_grenade_cd 
 
         if keys[pygame.K_f] and self.weapon_type == "hmg" and not self.is_shielding:
             if self.shoot_delay <= 0:
-                self.fire_bullet(bullets, all_sprites)
+                self.fire_bullet(bullets)
                 self.shoot_delay = 5
 
-    def fire_bullet(self, bullets, all_sprites):
-        keys = pygame.key.get_pressed()
+    def fire_bullet(self, bullets):
+        keys = self.game_ref.keys
         dx, dy = self.facing, 0
         if keys[pygame.K_UP]: 
             dy = -1
@@ -338,9 +949,7 @@ class Player(pygame.sprite.Sprite):
         is_hmg = (self.weapon_type == "hmg")
         dmg = 25 if is_hmg else 20
         
-        b = Bullet(self.rect.centerx, self.rect.centery, dx, dy, damage=dmg, is_hmg=is_hmg, miss_callback=self.game_ref.apply_miss_penalty)
-        all_sprites.add(b)
-        bullets.add(b)
+        bullets.spawn(self.rect.centerx, self.rect.centery, dx, dy, damage=dmg, owner=OWNER_PLAYER, is_hmg=is_hmg)
 
         if is_hmg:
             self.ammo -= 1
@@ -352,25 +961,23 @@ class Player(pygame.sprite.Sprite):
         if self.melee_cd > 0 or self.is_shielding:
             return
 
-        for e in enemies:
-            dist_x = abs(self.rect.centerx - e.rect.centerx)
-            dist_y = abs(self.rect.centery - e.rect.centery)
-
-            if dist_x < self.melee_range and dist_y < self.melee_range:
-                e.hp -= self.melee_dmg
-                slash = MeleeEffect(e.rect.centerx, e.rect.centery)
-                all_sprites.add(slash)
-                effects_group.add(slash)
-                
-                self.melee_cd = 40 
-                
-                add_score_callback(50) 
-                
-                if e.hp <= 0:
-                    spawn_loot_callback(e) 
-                    add_score_callback(e.score_val) # Kill Bonus
-                    e.kill()
-                break 
+        in_reach = enemies.box(self.rect.centerx, self.rect.centery, self.melee_range, self.melee_range)
+        if not in_reach:
+            return
+        e = in_reach[0]
+        e.hp -= self.melee_dmg
+        slash = MeleeEffect.pool.acquire(e.rect.centerx, e.rect.centery)
+        all_sprites.add(slash)
+        effects_group.add(slash)
+        
+        self.melee_cd = 40 
+        
+        add_score_callback(50) 
+        
+        if e.hp <= 0:
+            spawn_loot_callback(e) 
+            add_score_callback(e.score_val) # Kill Bonus
+            e.kill()
 
     def take_damage(self, amount):
         self.shield_regen_timer = 180 
@@ -397,7 +1004,7 @@ class Player(pygame.sprite.Sprite):
         self.rect.y = int(self.pos_y)
         
         self.on_ground = False
-        hits = pygame.sprite.spritecollide(self, platforms, False)
+        hits = platforms.spritecollide(self)
 
         for p in hits:
             if self.vel_y > 0 and self.rect.bottom < p.rect.bottom:
@@ -432,10 +1039,10 @@ class Player(pygame.sprite.Sprite):
                 self.shield += 0.5 * DT
 
 class Enemy(pygame.sprite.Sprite):
-    def __init__(self, x, y, color, hp, type_name, score_val, hit_score):
+    def __init__(self, x, y, image, hp, type_name, score_val, hit_score, rng=random, shoot_timer=None):
         super().__init__()
-        self.image = pygame.Surface((40, 40))
-        self.image.fill(color)
+        self.rng = rng
+        self.image = image
         self.rect = self.image.get_rect()
         self.rect.bottomleft = (x, y)
         
@@ -447,15 +1054,16 @@ class Enemy(pygame.sprite.Sprite):
         self.type_name = type_name
         self.score_val = score_val      
         self.hit_score = hit_score      
-        self.shoot_timer = random.randint(0, 100)
+        self.shoot_timer = rng.randint(0, 100) if shoot_timer is None else shoot_timer
 
     def check_bounds(self):
         if self.rect.y > SCREEN_HEIGHT + 50:
             self.kill()
 
 class Soldier(Enemy):
-    def __init__(self, x, y):
-        super().__init__(x, y, RED, 30, 'soldier', 100, 10)
+    def __init__(self, x, y, rng=random, shoot_timer=None):
+        super().__init__(x, y, ASSETS.filled(("enemy", RED), (40, 40), RED, self), 30, 'soldier', 100, 10,
+                         rng, shoot_timer)
         self.vel_y = 0
         self.facing = -1
         self.speed = 2
@@ -465,7 +1073,7 @@ class Soldier(Enemy):
         self.pos_y += self.vel_y * DT
         self.rect.y = int(self.pos_y)
         
-        hits = pygame.sprite.spritecollide(self, platforms, False)
+        hits = platforms.spritecollide(self)
         for p in hits:
             if self.vel_y > 0:
                 self.rect.bottom = p.rect.top
@@ -488,21 +1096,13 @@ class Soldier(Enemy):
 
         if self.shoot_timer > 90 and abs(dist_x) < 800:
             if (self.facing == 1 and dist_x > 0) or (self.facing == -1 and dist_x < 0):
-                b = Bullet(self.rect.centerx, self.rect.centery, self.facing, 0, damage=10, is_enemy=True)
-                bullets.add(b)
-                all_sprites.add(b)
+                bullets.spawn(self.rect.centerx, self.rect.centery, self.facing, 0, damage=10, owner=OWNER_ENEMY)
                 self.shoot_timer = 0
 
 class Tank(Enemy):
-    def __init__(self, x, y):
-        super().__init__(x, y, DARK_GREEN, 120, 'tank', 300, 30) 
-        self.image = pygame.Surface((90, 60))
-        self.image.fill(DARK_GREEN)
-        self.rect = self.image.get_rect()
-        self.rect.bottomleft = (x, y)
-        self.pos_x = float(x)
-        self.pos_y = float(self.rect.y)
-        
+    def __init__(self, x, y, rng=random, shoot_timer=None):
+        super().__init__(x, y, ASSETS.filled("tank", (90, 60), DARK_GREEN, self), 120, 'tank', 300, 30,
+                         rng, shoot_timer)
         self.vel_y = 0
         self.speed = 1
 
@@ -511,7 +1111,7 @@ class Tank(Enemy):
         self.pos_y += self.vel_y * DT
         self.rect.y = int(self.pos_y)
         
-        hits = pygame.sprite.spritecollide(self, platforms, False)
+        hits = platforms.spritecollide(self)
         for p in hits:
             if self.vel_y > 0:
                 self.rect.bottom = p.rect.top
@@ -536,8 +1136,9 @@ class Tank(Enemy):
             self.shoot_timer = 0
 
 class Helicopter(Enemy):
-    def __init__(self, x, y):
-        super().__init__(x, y, GREY, 60, 'heli', 500, 50)
+    def __init__(self, x, y, rng=random, shoot_timer=None):
+        super().__init__(x, y, ASSETS.filled(("enemy", GREY), (40, 40), GREY, self), 60, 'heli', 500, 50,
+                         rng, shoot_timer)
         self.start_y = y
         self.phase = 0
         self.pos_x = float(x)
@@ -559,18 +1160,12 @@ class Helicopter(Enemy):
             vel_x = math.cos(angle)
             vel_y = math.sin(angle)
             
-            b = Bullet(self.rect.centerx, self.rect.bottom, vel_x, vel_y, damage=20, is_enemy=True, bullet_img=bullet_img)
-            bullets.add(b)
-            all_sprites.add(b)
+            bullets.spawn(self.rect.centerx, self.rect.bottom, vel_x, vel_y, damage=20, owner=OWNER_ENEMY, image=bullet_img)
             self.shoot_timer = 0
 
 class BossHelicopter(Enemy):
-    def __init__(self, x, y):
-        super().__init__(x, y, PURPLE, 5000, 'boss_heli', 10000, 100)
-        self.image = pygame.Surface((200, 100))
-        self.image.fill(PURPLE)
-        pygame.draw.rect(self.image, DARK_GREEN, (10, 10, 180, 80))
-        pygame.draw.rect(self.image, RED, (50, 40, 20, 20)) 
+    def __init__(self, x, y, rng=random):
+        super().__init__(x, y, ASSETS.image("boss_heli", BossHelicopter.build, self), 5000, 'boss_heli', 10000, 100, rng)
         
         self.rect = self.image.get_rect()
         self.rect.center = (x, y)
@@ -603,84 +1198,1044 @@ class BossHelicopter(Enemy):
         if self.attack_cooldown > 0:
             self.attack_cooldown -= 1 * DT
         else:
-            attack_roll = random.choice(['mg', 'missile', 'bomb'])
+            attack_roll = self.rng.choice(['mg', 'missile', 'bomb'])
             
             if attack_roll == 'mg':
                 for i in range(5):
-                    spread = random.uniform(-0.2, 0.2)
+                    spread = self.rng.uniform(-0.2, 0.2)
                     dx = player.rect.centerx - self.rect.centerx
                     dy = player.rect.centery - self.rect.centery
                     angle = math.atan2(dy, dx) + spread
                     vx = math.cos(angle)
                     vy = math.sin(angle)
-                    b = Bullet(self.rect.centerx, self.rect.bottom, vx, vy, damage=15, is_enemy=True)
-                    bullets.add(b)
-                    all_sprites.add(b)
+                    bullets.spawn(self.rect.centerx, self.rect.bottom, vx, vy, damage=15, owner=OWNER_BOSS)
                 self.attack_cooldown = 60 
                 
             elif attack_roll == 'missile':
                 for i in range(3):
                     offset_x = (i - 1) * 40
-                    m = Missile(self.rect.centerx + offset_x, self.rect.centery, player)
+                    m = Missile(self.rect.centerx + offset_x, self.rect.centery, player, OWNER_BOSS)
                     all_sprites.add(m)
                     missiles_group.add(m)
                 self.attack_cooldown = 180 
                 
             elif attack_roll == 'bomb':
-                g = Grenade(self.rect.centerx, self.rect.bottom, 0, is_enemy=True)
+                g = Grenade.pool.acquire(self.rect.centerx, self.rect.bottom, 0, is_enemy=True)
                 all_sprites.add(g)
                 grenades_group.add(g)
                 self.attack_cooldown = 40 
 
+    @staticmethod
+    def build():
+        image = pygame.Surface((200, 100))
+        image.fill(PURPLE)
+        pygame.draw.rect(image, DARK_GREEN, (10, 10, 180, 80))
+        pygame.draw.rect(image, RED, (50, 40, 20, 20))
+        return image
+
 class Platform(pygame.sprite.Sprite):
     def __init__(self, x, y, w, h):
         super().__init__()
-        self.image = pygame.Surface((w, h))
-        self.image.fill(GREEN)
-        pygame.draw.rect(self.image, (80, 80, 80), (0,0,w,h), 2)
+        self.image = ASSETS.image(("platform", w, h), lambda: Platform.build(w, h), self)
         self.rect = self.image.get_rect()
         self.rect.topleft = (x, y)
 
+    @staticmethod
+    def build(w, h):
+        image = pygame.Surface((w, h))
+        image.fill(GREEN)
+        pygame.draw.rect(image, (80, 80, 80), (0,0,w,h), 2)
+        return image
+
+class PlatformGrid:
+    # Static terrain bucketed by x cell, platforms never move once placed
+    def __init__(self, cell_size=PLATFORM_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.order = {}
+        self.next_seq = 0
+
+    def __len__(self):
+        return len(self.order)
+
+    def span(self, rect):
+        return range(rect.left // self.cell_size, max(rect.left, rect.right - 1) // self.cell_size + 1)
+
+    def add(self, platform):
+        self.order[platform] = self.next_seq
+        self.next_seq += 1
+        for cx in self.span(platform.rect):
+            self.cells.setdefault(cx, []).append(platform)
+
+    def remove(self, platform):
+        if self.order.pop(platform, None) is None:
+            return
+        for cx in self.span(platform.rect):
+            cell = self.cells[cx]
+            cell.remove(platform)
+            if not cell:
+                del self.cells[cx]
+
+    def spritecollide(self, sprite):
+        rect = sprite.rect
+        hits = []
+        for cx in self.span(rect):
+            for p in self.cells.get(cx, ()):
+                if rect.colliderect(p.rect) and p not in hits:
+                    hits.append(p)
+        # Same order spritecollide would give against the platforms group
+        if len(hits) > 1:
+            hits.sort(key=self.order.__getitem__)
+        return hits
+
+    def groupcollide(self, group):
+        crashed = {}
+        for s in group:
+            hits = self.spritecollide(s)
+            if hits:
+                crashed[s] = hits
+        return crashed
+
+class SpatialGroup(pygame.sprite.Group):
+    # Sprites bucketed by x cell for window, circle and box queries.
+    # Whoever moves a member refiles it; enemies only move in their own update.
+    def __init__(self, cell_size=SPATIAL_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.cell_of = {}
+        self.seq = {}
+        self.next_seq = 0
+        self.max_width = 0
+        super().__init__()
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self.seq[sprite] = self.next_seq
+        self.next_seq += 1
+        self.max_width = max(self.max_width, sprite.rect.w)
+        self.file(sprite)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.unfile(sprite)
+        del self.seq[sprite]
+
+    def file(self, sprite):
+        cx = sprite.rect.x // self.cell_size
+        self.cell_of[sprite] = cx
+        self.cells.setdefault(cx, {})[sprite] = None
+
+    def unfile(self, sprite):
+        cx = self.cell_of.pop(sprite)
+        bucket = self.cells[cx]
+        del bucket[sprite]
+        if not bucket:
+            del self.cells[cx]
+
+    def refile(self, sprites):
+        cs = self.cell_size
+        for s in sprites:
+            cx = self.cell_of.get(s)
+            if cx is not None and s.rect.x // cs != cx:
+                self.unfile(s)
+                self.file(s)
+
+    def span(self, left, right):
+        cs = self.cell_size
+        for cx in range(int(left // cs), int(right // cs) + 1):
+            yield from self.cells.get(cx, ())
+
+    # Every query returns members in the order they were added, like iterating the group
+
+    def window(self, left, right):
+        # left < rect.x < right
+        hits = [s for s in self.span(left, right) if left < s.rect.x < right]
+        hits.sort(key=self.seq.__getitem__)
+        return hits
+
+    def circle(self, cx, cy, radius):
+        # Centers closer than radius to (cx, cy)
+        r2 = radius * radius
+        hits = []
+        for s in self.span(cx - radius - self.max_width, cx + radius):
+            dx = s.rect.centerx - cx
+            dy = s.rect.centery - cy
+            if dx * dx + dy * dy < r2:
+                hits.append(s)
+        hits.sort(key=self.seq.__getitem__)
+        return hits
+
+    def box(self, cx, cy, half_w, half_h):
+        # Centers strictly inside the box around (cx, cy)
+        hits = [s for s in self.span(cx - half_w - self.max_width, cx + half_w)
+                if abs(s.rect.centerx - cx) < half_w and abs(s.rect.centery - cy) < half_h]
+        hits.sort(key=self.seq.__getitem__)
+        return hits
+
+    def collide_rect(self, rect):
+        # Members whose rect overlaps `rect`, as pygame.sprite.spritecollide would find them
+        colliderect = rect.colliderect
+        hits = [s for s in self.span(rect.left - self.max_width, rect.right) if colliderect(s.rect)]
+        hits.sort(key=self.seq.__getitem__)
+        return hits
+
+    def groupcollide(self, other):
+        # pygame.sprite.groupcollide(self, other, False, False): members in group order, each with the
+        # sprites of `other` it touches in that group's order
+        crashed = {}
+        for b in other:
+            for a in self.collide_rect(b.rect):
+                crashed.setdefault(a, []).append(b)
+        return dict(sorted(crashed.items(), key=lambda item: self.seq[item[0]]))
+
+class FrameProfiler:
+    # Wall time per named phase, one row per rendered frame (or per tick when headless)
+    def __init__(self, window=PROFILE_WINDOW):
+        self.enabled = False
+        self.window = deque(maxlen=window)
+        self.rows = None
+        self.current = {}
+        self.mark = 0.0
+        self.frame_index = 0
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+        self.current = {}
+
+    def record(self):
+        # Keep every frame for export() on top of the rolling window
+        self.rows = []
+        self.enable()
+
+    def begin(self):
+        if self.enabled:
+            self.mark = time.perf_counter()
+
+    def lap(self, phase):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.current[phase] = self.current.get(phase, 0.0) + (now - self.mark) * 1000
+        self.mark = now
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        self.frame_index += 1
+        if self.current:
+            self.window.append(self.current)
+            if self.rows is not None:
+                self.rows.append((self.frame_index, self.current))
+        self.current = {}
+
+    def summary(self):
+        totals = {}
+        peaks = {}
+        for frame in self.window:
+            for phase, ms in frame.items():
+                totals[phase] = totals.get(phase, 0.0) + ms
+                peaks[phase] = max(peaks.get(phase, 0.0), ms)
+        n = max(1, len(self.window))
+        return {phase: (totals[phase] / n, peaks[phase]) for phase in totals}
+
+    def export(self, path):
+        rows = self.rows or [(i, frame) for i, frame in enumerate(self.window)]
+        phases = []
+        for _, frame in rows:
+            for phase in frame:
+                if phase not in phases:
+                    phases.append(phase)
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["frame"] + phases)
+                for index, frame in rows:
+                    writer.writerow([index] + [round(frame.get(p, 0.0), 4) for p in phases])
+        else:
+            with open(path, "w") as f:
+                json.dump({"phases": phases,
+                           "frames": [{"frame": index, **{p: round(ms, 4) for p, ms in frame.items()}}
+                                      for index, frame in rows]}, f)
+
+class TelemetryRecorder:
+    # Samples sprite populations and surface memory every `interval` ticks into a ring buffer and appends them,
+    # with tracemalloc's top allocators, to a JSON lines file so long sessions can be checked for growth afterwards
+    def __init__(self, path, interval=TELEMETRY_INTERVAL, ring=TELEMETRY_RING,
+                 flush_every=TELEMETRY_FLUSH_EVERY, top=TELEMETRY_TOP):
+        self.path = path
+        self.interval = interval
+        self.flush_every = flush_every
+        self.top = top
+        self.samples = deque(maxlen=ring)
+        self.unflushed = 0 # newest samples in the ring not yet written
+        self.ticks = 0
+        self.start = time.perf_counter()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def tick(self, game):
+        self.ticks += 1
+        if self.ticks % self.interval:
+            return
+        self.samples.append(self.sample(game))
+        self.unflushed += 1
+        if self.unflushed >= self.flush_every:
+            self.flush()
+
+    def sample(self, game):
+        bullets = game.projectiles.counts()
+        groups = {
+            "all_sprites": len(game.all_sprites),
+            "bullets": bullets["player"],
+            "enemy_bullets": bullets["enemy"] + bullets["boss"],
+            "missiles": len(game.missiles),
+            "enemies": len(game.enemies) + len(game.boss_group),
+            "grenades": len(game.grenades) + len(game.enemy_grenades),
+            "items": len(game.items),
+            "effects": len(game.effects),
+            "platforms": len(game.platforms),
+        }
+        # Shared images count once
+        surfaces = {}
+        for group in (game.all_sprites, game.platforms):
+            for s in group:
+                surfaces[id(s.image)] = s.image
+        for chunk in game.chunks.chunks:
+            if chunk.terrain is not None:
+                surfaces[id(chunk.terrain)] = chunk.terrain
+        for image in game.projectiles.images:
+            surfaces[id(image)] = image
+        traced, traced_peak = tracemalloc.get_traced_memory()
+        return {
+            "tick": self.ticks,
+            "t": round(time.perf_counter() - self.start, 3),
+            "groups": groups,
+            "surfaces": len(surfaces),
+            "surface_bytes": sum(image.get_pitch() * image.get_height() for image in surfaces.values()),
+            "traced_bytes": traced,
+            "traced_peak": traced_peak,
+        }
+
+    def top_allocators(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+        return [[f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}", stat.size, stat.count]
+                for stat in snapshot.statistics("lineno")[:self.top]]
+
+    def recent(self, count):
+        return list(self.samples)[-count:] if count else []
+
+    def flush(self):
+        pending = self.recent(min(self.unflushed, len(self.samples)))
+        if not pending:
+            return
+        pending[-1]["top"] = self.top_allocators()
+        with open(self.path, "a") as f:
+            for sample in pending:
+                f.write(json.dumps(sample, separators=(",", ":")) + "\n")
+        self.unflushed = 0
+
+class Chunk:
+    def __init__(self, start_x, width):
+        self.start_x = start_x
+        self.end_x = start_x + width
+        self.sprites = []
+        self.platforms = []
+        self.terrain = None
+        self.terrain_rect = None
+
+    def bake_terrain(self):
+        # Terrain never changes after generation, so the chunk draws it as one surface
+        bounds = self.platforms[0].rect.unionall([p.rect for p in self.platforms[1:]])
+        surface = pygame.Surface(bounds.size)
+        surface.fill(TERRAIN_COLORKEY)
+        surface.blits([(p.image, (p.rect.x - bounds.x, p.rect.y - bounds.y)) for p in self.platforms], False)
+        surface.set_colorkey(TERRAIN_COLORKEY, pygame.RLEACCEL)
+        self.terrain = surface
+        self.terrain_rect = bounds
+
+class ChunkLayout:
+    # Plain data for one chunk: obstacle rects and (enemy class, x, y, shoot_timer) spawns
+    def __init__(self, start_x, width, ground_y, obstacles, spawns):
+        self.start_x = start_x
+        self.width = width
+        self.ground_y = ground_y
+        self.obstacles = obstacles
+        self.spawns = spawns
+
+class ChunkPlanner:
+    # Draws chunk layouts on a worker thread, in world order, from a stream seeded by the run seed alone,
+    # so what gets built never depends on when the main thread asks for it
+    def __init__(self, seed, ahead=CHUNK_PLAN_AHEAD):
+        self.rng = random.Random(f"{seed}/layout")
+        self.layouts = queue.Queue(maxsize=ahead)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.plan_loop, name="chunk-planner", daemon=True)
+        self.thread.start()
+
+    def plan(self, start_x, width):
+        rng = self.rng
+        ground_y = SCREEN_HEIGHT - 60
+        obstacles = []
+        spawns = []
+        for i in range(width // 300):
+            obs_w = rng.randint(80, 180)
+            obs_h = rng.choice([40, 80, 110])
+            obs_x = start_x + rng.randint(100, width - 400)
+            obs_y = ground_y - obs_h
+            obstacles.append((obs_x, obs_y, obs_w, obs_h))
+
+            roll = rng.random()
+            if roll < 0.4:
+                spawns.append((Soldier, obs_x + obs_w//2, obs_y - 10, rng.randint(0, 100)))
+            elif roll < 0.6:
+                spawns.append((Tank, obs_x + 200, ground_y - 10, rng.randint(0, 100)))
+            elif roll < 0.8:
+                spawns.append((Helicopter, obs_x, 150, rng.randint(0, 100)))
+        return ChunkLayout(start_x, width, ground_y, obstacles, spawns)
+
+    def plan_loop(self):
+        start_x, width = 0, FIRST_CHUNK_WIDTH
+        while not self.stopped.is_set():
+            layout = self.plan(start_x, width)
+            while not self.stopped.is_set():
+                try:
+                    self.layouts.put(layout, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            start_x += width
+            width = CHUNK_WIDTH
+
+    def next(self, block=True):
+        try:
+            return self.layouts.get(block)
+        except queue.Empty:
+            return None
+
+    def stop(self):
+        self.stopped.set()
+
+class ChunkBuilder:
+    # Turns a layout into sprites and baked terrain a step at a time; nothing joins the world until commit
+    def __init__(self, layout, rng):
+        self.layout = layout
+        self.rng = rng
+        self.chunk = Chunk(layout.start_x, layout.width)
+        self.ground = Platform(layout.start_x, layout.ground_y, layout.width, 100)
+        self.chunk.platforms.append(self.ground)
+        self.enemies = []
+        self.steps = self.build()
+        self.done = False
+
+    def build(self):
+        chunk = self.chunk
+        for obs_x, obs_y, obs_w, obs_h in self.layout.obstacles:
+            chunk.platforms.append(Platform(obs_x, obs_y, obs_w, obs_h))
+            yield
+        for cls, x, y, shoot_timer in self.layout.spawns:
+            self.enemies.append(cls(x, y, self.rng, shoot_timer))
+            yield
+        chunk.bake_terrain()
+
+    def step(self):
+        try:
+            next(self.steps)
+        except StopIteration:
+            self.done = True
+
+    def pump(self, budget):
+        deadline = time.perf_counter() + budget
+        while not self.done and time.perf_counter() < deadline:
+            self.step()
+
+    def finish(self):
+        while not self.done:
+            self.step()
+
+class ChunkManager:
+    def __init__(self, platform_grid=None, unload_margin=CHUNK_UNLOAD_MARGIN):
+        self.chunks = [] # ordered by start_x
+        self.platform_grid = platform_grid
+        self.unload_margin = unload_margin
+        self.loaded_total = 0
+        self.unloaded_total = 0
+
+    def attach(self, chunk):
+        self.chunks.append(chunk)
+        self.loaded_total += 1
+        return chunk
+
+    def chunk_at(self, x):
+        for chunk in self.chunks:
+            if x < chunk.end_x:
+                return chunk
+        return self.chunks[-1] if self.chunks else None
+
+    def adopt(self, sprite):
+        chunk = self.chunk_at(sprite.rect.centerx)
+        if chunk:
+            chunk.sprites.append(sprite)
+
+    def unload_behind(self, camera_x):
+        cutoff = camera_x - self.unload_margin
+        while len(self.chunks) > 1 and self.chunks[0].end_x < cutoff:
+            chunk = self.chunks.pop(0)
+            self.unloaded_total += 1
+            for s in chunk.sprites:
+                if not s.alive():
+                    continue
+                # Enemies that wandered forward move to the chunk they are in now
+                if s.rect.right < cutoff:
+                    s.kill()
+                    if self.platform_grid is not None and isinstance(s, Platform):
+                        self.platform_grid.remove(s)
+                else:
+                    self.adopt(s)
+
+    def visible(self, left, right):
+        return [c for c in self.chunks if c.terrain is not None
+                and c.terrain_rect.right > left and c.terrain_rect.left < right]
+
+    def stats(self):
+        return {
+            "chunks": len(self.chunks),
+            "sprites": sum(1 for c in self.chunks for s in c.sprites if s.alive()),
+            "loaded_total": self.loaded_total,
+            "unloaded_total": self.unloaded_total,
+        }
+
+class TextCache:
+    def __init__(self, limit=TEXT_CACHE_LIMIT):
+        self.surfaces = {}
+        self.limit = limit
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            if len(self.surfaces) >= self.limit:
+                self.surfaces.clear()
+            surface = self.surfaces[key] = font.render(text, True, color)
+            self.misses += 1
+        else:
+            self.hits += 1
+        return surface
+
+class Hud:
+    # Widgets are painted into one transparent layer and repainted only when their value changes
+    def __init__(self, font, big_font):
+        self.font = font
+        self.big_font = big_font
+        self.text = TextCache()
+        self.layer = pygame.Surface((SCREEN_WIDTH, HUD_LAYER_HEIGHT), pygame.SRCALPHA)
+        self.widgets = {}
+        self.repaints = 0
+
+    def widget(self, name, key, paint):
+        prev = self.widgets.get(name)
+        if prev is not None and prev[0] == key:
+            return prev[1]
+        if prev is not None and prev[1] is not None:
+            self.layer.fill((0, 0, 0, 0), prev[1])
+        rect = paint() if key is not None else None
+        self.widgets[name] = (key, rect)
+        self.repaints += 1
+        return rect
+
+    def paint_bar(self, rect, back, fill, fill_rect, border, label=None):
+        area = pygame.draw.rect(self.layer, back, rect)
+        pygame.draw.rect(self.layer, fill, fill_rect)
+        pygame.draw.rect(self.layer, WHITE, rect, border)
+        if label:
+            area = area.union(self.layer.blit(*label))
+        return area
+
+    def paint_text(self, font, text, color, pos):
+        return self.layer.blit(self.text.render(font, text, color), pos)
+
+    def draw(self, screen, game, view):
+        player = game.player
+
+        hp_pct = max(0, player.hp / player.max_hp)
+        hp_col = (0, 255, 0) if hp_pct > 0.5 else (255, 0, 0)
+        hp_fill = pygame.Rect(10, 10, 200 * hp_pct, 20)
+
+        shield_pct = max(0, player.shield / player.max_shield)
+        shield_col = CYAN if player.shield > 0 else (50, 50, 50)
+        shield_fill = pygame.Rect(10, 35, 150 * shield_pct, 10)
+
+        grenade_pct = 1.0 - (max(0, player.grenade_cd) / player.max_grenade_cd)
+        grenade_col = ORANGE if grenade_pct >= 1.0 else (100, 50, 0)
+        grenade_fill = pygame.Rect(10, 50, 100 * grenade_pct, 8)
+
+        w_txt = "PISTOL"
+        w_col = WHITE
+        if player.weapon_type == "hmg":
+            w_txt = f"MACHINE GUN ({player.ammo})"
+            w_col = GOLD
+
+        boss_key = None
+        if game.boss_fight_active and len(game.boss_group) > 0:
+            boss = game.boss_group.sprites()[0]
+            bar_w = 600
+            bar_h = 30
+            bar_x = (SCREEN_WIDTH - bar_w) // 2
+            bar_y = 50
+            boss_fill = pygame.Rect(bar_x, bar_y, bar_w * max(0, boss.hp / boss.max_hp), bar_h)
+            boss_key = boss_fill.w
+
+        rects = [
+            self.widget("hp", (hp_fill.w, hp_col), lambda: self.paint_bar(
+                (10, 10, 200, 20), (50,0,0), hp_col, hp_fill, 2)),
+            self.widget("shield", (shield_fill.w, shield_col), lambda: self.paint_bar(
+                (10, 35, 150, 10), (0,50,50), shield_col, shield_fill, 1)),
+            self.widget("grenade", (grenade_fill.w, grenade_col), lambda: self.paint_bar(
+                (10, 50, 100, 8), (50, 25, 0), grenade_col, grenade_fill, 1,
+                (self.text.render(self.font, "G", WHITE), (115, 45)))),
+            self.widget("score", game.score, lambda: self.paint_text(
+                self.font, f"SCORE: {game.score}", WHITE, (SCREEN_WIDTH - 150, 10))),
+            self.widget("weapon", (w_txt, w_col), lambda: self.paint_text(self.font, w_txt, w_col, (10, 70))),
+            self.widget("info", True, lambda: self.paint_text(
+                self.font, "F: Shoot (Hold for MG) | C: Shield | G: Grenade", GREY, (220, 10))),
+            self.widget("boss", boss_key, lambda: self.paint_boss(bar_x, bar_y, bar_w, bar_h, boss_fill)),
+        ]
+        rects = [r for r in rects if r is not None]
+        bounds = rects[0].unionall(rects[1:])
+        if view.scale == 1.0:
+            screen.blit(self.layer, bounds, area=bounds)
+        else:
+            bounds = view.rect(bounds)
+            rects = [screen.blit(view.image(self.layer, self.repaints, smooth=True), bounds, area=bounds)]
+
+        if game.hmg_pickup_msg_timer > 0:
+            msg = self.text.render(self.big_font, "HEAVY MACHINE GUN!", GOLD)
+            rects.append(view.blit(screen, msg, (SCREEN_WIDTH//2 - 200, SCREEN_HEIGHT//2 - 50), smooth=True))
+        return rects
+
+    def paint_boss(self, bar_x, bar_y, bar_w, bar_h, boss_fill):
+        area = self.paint_bar((bar_x, bar_y, bar_w, bar_h), BLACK, PURPLE, boss_fill, 2)
+        area = area.union(self.paint_text(self.big_font, "GIANT HELICOPTER", RED, (bar_x, bar_y - 40)))
+        return area.union(self.paint_text(self.font, "WARNING: BOSS APPROACHING!", RED, (SCREEN_WIDTH//2 - 120, 90)))
+
+    def stats(self):
+        return {"repaints": self.repaints, "text_hits": self.text.hits, "text_misses": self.text.misses,
+                "text_cached": len(self.text.surfaces)}
+
+class RenderView:
+    # Maps the logical SCREEN_WIDTH x SCREEN_HEIGHT view onto an internal canvas that may be smaller
+    # than the window, the renderer scales it up once per frame
+    def __init__(self, output, scale=1.0, dynamic=False, target_ms=1000 / FPS):
+        self.output = output
+        self.levels = sorted({scale, *(level for level in RENDER_SCALE_LEVELS if level < scale)}, reverse=True)
+        self.dynamic = dynamic
+        self.target_ms = target_ms
+        self.canvases = {}
+        self.cache = weakref.WeakKeyDictionary()
+        self.avg_ms = None
+        self.cooldown = RENDER_SCALE_COOLDOWN
+        self.changes = 0
+        self.set_scale(scale)
+
+    def set_scale(self, scale):
+        self.scale = scale
+        size = (round(SCREEN_WIDTH * scale), round(SCREEN_HEIGHT * scale))
+        if self.output.get_size() == size:
+            # Full resolution draws straight to the output
+            self.canvas = self.output
+        else:
+            canvas = self.canvases.get(scale)
+            if canvas is None:
+                canvas = self.canvases[scale] = pygame.Surface(size).convert(self.output)
+            self.canvas = canvas
+        # Scaled copies only stay valid for the level they were made at
+        self.cache = weakref.WeakKeyDictionary()
+
+    def pos(self, x, y):
+        s = self.scale
+        return (math.floor(x * s), math.floor(y * s))
+
+    def rect(self, rect):
+        s = self.scale
+        left, top = math.floor(rect.x * s), math.floor(rect.y * s)
+        return pygame.Rect(left, top, math.ceil(rect.right * s) - left, math.ceil(rect.bottom * s) - top)
+
+    def image(self, image, version=None, smooth=False):
+        # `version` lets owners of surfaces that are redrawn in place invalidate their copy
+        if self.scale == 1.0:
+            return image
+        entry = self.cache.get(image)
+        if entry is None or entry[0] != version:
+            w, h = image.get_size()
+            size = (max(1, round(w * self.scale)), max(1, round(h * self.scale)))
+            scale = pygame.transform.smoothscale if smooth and image.get_bitsize() == 32 else pygame.transform.scale
+            entry = self.cache[image] = (version, scale(image, size))
+        return entry[1]
+
+    def blit(self, surface, image, pos, smooth=False):
+        return surface.blit(self.image(image, smooth=smooth), self.pos(*pos))
+
+    def observe(self, frame_ms):
+        # Dynamic mode: drop a level when frames run over the target, climb back once there is headroom
+        if not self.dynamic:
+            return False
+        self.avg_ms = frame_ms if self.avg_ms is None else self.avg_ms * 0.9 + frame_ms * 0.1
+        self.cooldown -= 1
+        if self.cooldown > 0:
+            return False
+        i = self.levels.index(self.scale)
+        if self.avg_ms > self.target_ms and i + 1 < len(self.levels):
+            self.set_scale(self.levels[i + 1])
+        elif self.avg_ms < self.target_ms * RENDER_SCALE_HEADROOM and i > 0:
+            self.set_scale(self.levels[i - 1])
+        else:
+            return False
+        self.cooldown = RENDER_SCALE_COOLDOWN
+        self.changes += 1
+        return True
+
+    def stats(self):
+        w, h = self.canvas.get_size()
+        return {"scale": round(self.scale, 4), "internal": f"{w}x{h}", "dynamic": self.dynamic,
+                "changes": self.changes, "cached": len(self.cache)}
+
+class QualityGovernor:
+    # Steps QUALITY_LEVELS down while update + draw run over budget and back up once there is headroom
+    def __init__(self, budget_ms=QUALITY_BUDGET_MS, levels=QUALITY_LEVELS):
+        self.budget_ms = budget_ms
+        self.levels = levels
+        self.level = 0
+        self.avg_ms = None
+        self.cooldown = RENDER_SCALE_COOLDOWN
+        self.frame = 0
+        self.history = deque(maxlen=QUALITY_HISTORY) # (frame, from level, to level, average ms)
+
+    @property
+    def settings(self):
+        return self.levels[self.level]
+
+    def observe(self, frame_ms):
+        self.frame += 1
+        self.avg_ms = frame_ms if self.avg_ms is None else self.avg_ms * 0.9 + frame_ms * 0.1
+        self.cooldown -= 1
+        if self.cooldown > 0:
+            return False
+        if self.avg_ms > self.budget_ms and self.level + 1 < len(self.levels):
+            level = self.level + 1
+        elif self.avg_ms < self.budget_ms * RENDER_SCALE_HEADROOM and self.level > 0:
+            level = self.level - 1
+        else:
+            return False
+        self.history.append((self.frame, self.level, level, self.avg_ms))
+        self.level = level
+        self.cooldown = RENDER_SCALE_COOLDOWN
+        return True
+
+    def stats(self):
+        return {"level": self.level, "avg_ms": round(self.avg_ms or 0.0, 3), "changes": len(self.history)}
+
+class Renderer:
+    # Fill the whole screen and flip every frame
+    name = "full"
+
+    def __init__(self, screen, present=True, output=None):
+        self.screen = screen
+        self.output = screen if output is None else output
+        self.present_to_display = present
+        self.frames = 0
+        self.full_frames = 0
+        self.pixels = 0
+
+    def begin(self, camera_x):
+        self.screen.fill(BLACK)
+
+    def draw_world(self, items):
+        self.screen.blits([(image, pos) for _, image, pos in items], False)
+
+    def mark(self, rects):
+        pass
+
+    def set_canvas(self, canvas):
+        self.screen = canvas
+
+    def upscale(self):
+        if self.screen is not self.output:
+            pygame.transform.scale(self.screen, self.output.get_size(), self.output)
+
+    def present(self):
+        self.upscale()
+        if self.present_to_display:
+            pygame.display.flip()
+        self.frames += 1
+        self.full_frames += 1
+        self.pixels += self.screen.get_width() * self.screen.get_height()
+
+    def stats(self):
+        return {
+            "renderer": self.name,
+            "frames": self.frames,
+            "full_frames": self.full_frames,
+            "pixels_per_frame": self.pixels / self.frames if self.frames else 0.0,
+        }
+
+class DirtyRenderer(Renderer):
+    # Only clears, redraws and presents the areas that changed since the last frame.
+    # A camera scroll moves every pixel, so those frames fall back to a full redraw: the camera follows
+    # the player, so this only pays off while it holds still (boss fights, standing, game over).
+    # Shifting the last frame would not help either, a scrolled window still has to be presented whole.
+    name = "dirty"
+
+    def __init__(self, screen, present=True, output=None):
+        super().__init__(screen, present, output)
+        self.last = {}
+        self.last_marks = []
+        self.marks = []
+        self.dirty = []
+        self.camera_x = None
+        self.full = True
+
+    def begin(self, camera_x):
+        self.full = self.full or camera_x != self.camera_x
+        self.camera_x = camera_x
+        self.marks = []
+        if self.full:
+            self.screen.fill(BLACK)
+
+    def draw_world(self, items):
+        screen = self.screen
+        current = {key: (image, pos) for key, image, pos in items}
+        if self.full:
+            screen.blits([(image, pos) for _, image, pos in items], False)
+            self.last = current
+            self.dirty = []
+            return
+
+        # Erase whatever moved, changed, vanished or was drawn over the world last frame
+        cleared = [pygame.Rect(r) for r in self.last_marks]
+        for key, (image, pos) in self.last.items():
+            now = current.get(key)
+            if now is None or now[0] is not image or now[1] != pos:
+                cleared.append(pygame.Rect(pos, image.get_size()))
+        for r in cleared:
+            screen.fill(BLACK, r)
+
+        dirty = cleared
+        for key, image, pos in items:
+            prev = self.last.get(key)
+            rect = pygame.Rect(pos, image.get_size())
+            if prev is None or prev[0] is not image or prev[1] != pos or rect.collidelist(dirty) != -1:
+                screen.blit(image, pos)
+                dirty.append(rect)
+        self.last = current
+        self.dirty = dirty
+
+    def mark(self, rects):
+        self.marks.extend(rects)
+
+    def set_canvas(self, canvas):
+        super().set_canvas(canvas)
+        self.last = {}
+        self.last_marks = []
+        self.full = True
+
+    def present(self):
+        self.frames += 1
+        screen_rect = self.screen.get_rect()
+        if self.full:
+            self.full_frames += 1
+            self.pixels += screen_rect.w * screen_rect.h
+            self.upscale()
+            if self.present_to_display:
+                pygame.display.flip()
+        else:
+            rects = [r.clip(screen_rect) for r in self.dirty + self.marks]
+            rects = [r for r in rects if r.w and r.h]
+            area = sum(r.w * r.h for r in rects)
+            if area > screen_rect.w * screen_rect.h * DIRTY_FULL_RATIO:
+                # Past this much overlap one flip is cheaper than many small updates
+                self.full_frames += 1
+                area = screen_rect.w * screen_rect.h
+                rects = None
+            self.pixels += area
+            if self.screen is not self.output:
+                # The whole canvas is scaled up, only the changed areas are pushed to the window
+                self.upscale()
+                if rects:
+                    sx = self.output.get_width() / screen_rect.w
+                    sy = self.output.get_height() / screen_rect.h
+                    rects = [pygame.Rect(math.floor(r.x * sx), math.floor(r.y * sy),
+                                         math.ceil(r.w * sx) + 1, math.ceil(r.h * sy) + 1).clip(self.output.get_rect())
+                             for r in rects]
+            if self.present_to_display:
+                if rects is None:
+                    pygame.display.flip()
+                elif rects:
+                    pygame.display.update(rects)
+        self.last_marks = self.marks
+        self.full = False
+
+RENDERERS = {"full": Renderer, "dirty": DirtyRenderer}
+
+class Leaderboard:
+    # Top runs in SQLite (WAL). Read once at startup, written by a background thread so
+    # saving a run never stalls a frame; each insert is one atomic transaction.
+    def __init__(self, path=LEADERBOARD_PATH, size=LEADERBOARD_SIZE, legacy_path=LEGACY_HIGHSCORE_PATH):
+        self.path = path
+        self.size = size
+        self.pending = queue.Queue()
+        self.errors = 0
+        try:
+            self.top = self.load(legacy_path)
+        except sqlite3.DatabaseError as e:
+            # A corrupt database is kept for inspection and replaced by a fresh one
+            print(f"leaderboard: {path} is unreadable ({e}), moving it to {path}.corrupt", file=sys.stderr)
+            try:
+                self.set_aside()
+                self.top = self.load(legacy_path)
+            except (OSError, sqlite3.Error) as e:
+                print(f"leaderboard: running without saved scores, {e}", file=sys.stderr)
+                self.top = []
+        self.writer = threading.Thread(target=self.write_loop, name="leaderboard-writer", daemon=True)
+        self.writer.start()
+
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=5)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, score INTEGER NOT NULL, "
+                       "distance REAL, played_at TEXT NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS runs_by_score ON runs (score DESC)")
+        except sqlite3.Error:
+            db.close()
+            raise
+        return db
+
+    def load(self, legacy_path):
+        db = self.connect()
+        try:
+            self.migrate(db, legacy_path)
+            return db.execute("SELECT score, distance, played_at FROM runs ORDER BY score DESC, id LIMIT ?",
+                              (self.size,)).fetchall()
+        finally:
+            db.close()
+
+    def set_aside(self):
+        # The WAL and shared-memory files belong to the bad database too
+        os.replace(self.path, self.path + ".corrupt")
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.replace(self.path + suffix, self.path + ".corrupt" + suffix)
+
+    def migrate(self, db, legacy_path):
+        if not os.path.exists(legacy_path) or db.execute("SELECT 1 FROM runs LIMIT 1").fetchone():
+            return
+        try:
+            with open(legacy_path) as f:
+                text = f.read().strip()
+            score = int(text)
+            mtime = os.path.getmtime(legacy_path)
+        except (OSError, ValueError) as e:
+            # Torn, binary or unreadable files leave the leaderboard empty rather than stop the game
+            print(f"leaderboard: ignoring {legacy_path}, {e}", file=sys.stderr)
+            return
+        if score > 0:
+            played_at = datetime.fromtimestamp(mtime, timezone.utc).isoformat()
+            with db:
+                db.execute("INSERT INTO runs (score, distance, played_at) VALUES (?, NULL, ?)", (score, played_at))
+
+    def best(self):
+        return self.top[0][0] if self.top else 0
+
+    def submit(self, score, distance):
+        played_at = datetime.now(timezone.utc).isoformat()
+        self.top = sorted(self.top + [(score, distance, played_at)], key=lambda run: -run[0])[:self.size]
+        self.pending.put((score, distance, played_at))
+
+    def write_loop(self):
+        try:
+            db = self.connect()
+        except sqlite3.Error as e:
+            print(f"leaderboard: cannot open {self.path}, runs will not be saved: {e}", file=sys.stderr)
+            db = None
+        try:
+            while True:
+                run = self.pending.get()
+                if run is None:
+                    break
+                if db is None:
+                    self.errors += 1
+                    continue
+                try:
+                    with db:
+                        db.execute("INSERT INTO runs (score, distance, played_at) VALUES (?, ?, ?)", run)
+                        db.execute("DELETE FROM runs WHERE id NOT IN "
+                                   "(SELECT id FROM runs ORDER BY score DESC, id LIMIT ?)", (self.size,))
+                except sqlite3.Error as e:
+                    self.errors += 1
+                    print(f"leaderboard: could not save run {run}: {e}", file=sys.stderr)
+        finally:
+            if db is not None:
+                db.close()
+
+    def close(self, timeout=5):
+        # Flush queued runs before exit
+        self.pending.put(None)
+        self.writer.join(timeout)
+
 class Game:
-    def __init__(self):
+    def __init__(self, headless=False, renderer="full", render_scale=1.0, dynamic_resolution=False,
+                 adaptive_quality=False, seed=None):
+        self.headless = headless
+        if headless:
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+            os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
         pygame.init()
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption("Metal Slug: Clone")
+        if headless:
+            # 1x1 dummy display so surfaces can still be converted, the world renders offscreen
+            pygame.display.set_mode((1, 1))
+            self.screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        else:
+            # The window stays full size at any internal resolution, the renderer scales the canvas up to it
+            self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+            pygame.display.set_caption("Metal Slug: Clone")
+        # The governor owns the internal resolution when it runs; it never runs headless
+        self.governor = QualityGovernor() if adaptive_quality and not headless else None
+        self.view = RenderView(self.screen, render_scale, dynamic_resolution and self.governor is None)
+        self.base_scale = render_scale
+        self.enemy_wake = QUALITY_LEVELS[0][3]
+        self.renderer = RENDERERS[renderer](self.view.canvas, present=not headless, output=self.screen)
         self.clock = pygame.time.Clock()
         self.running = True
+        self.keys = KeyState()
+        self.pending_keys = []
+        self.profiler = FrameProfiler()
+        self.show_profiler = False
         self.font = pygame.font.SysFont("Arial", 18)
         self.big_font = pygame.font.SysFont("Arial", 40, bold=True)
         self.title_font = pygame.font.SysFont("Arial", 60, bold=True)
-
-        bullet_filename = 'assets/beras.png' 
-        if os.path.exists(bullet_filename):
-            try:
-                raw_image = pygame.image.load(bullet_filename).convert_alpha()
-                self.heli_bullet_img = pygame.transform.scale(raw_image, (50, 50))
-            except Exception as e:
-                self.heli_bullet_img = None
-        else:
-            self.heli_bullet_img = None
-
-        self.highscore = self.load_high_score()
-        self.new_game()
-
-    def load_high_score(self):
-        filename = "highscore.txt"
-        if os.path.exists(filename):
-            try:
-                with open(filename, "r") as f:
-                    return int(f.read())
-            except:
-                return 0
-        return 0
-
-    def save_high_score(self):
-        filename = "highscore.txt"
-        with open(filename, "w") as f:
-            f.write(str(self.highscore))
-
-    def new_game(self):
+        self.hud = Hud(self.font, self.big_font)
+        self.game_over_overlay = None
+
+        self.heli_bullet_img = ASSETS.load("heli_bullet", os.path.join(ASSET_DIR, 'beras.png'), (50, 50), self)
+
+        self.recorder = None
+        self.telemetry = None
+        # Headless runs (benchmarks, replays, batches) never touch the player's leaderboard
+        self.leaderboard = None if headless else Leaderboard()
+        self.highscore = self.leaderboard.best() if self.leaderboard else 0
+        self.new_game(seed)
+
+    def new_game(self, seed=None):
+        if hasattr(self, "all_sprites"):
+            for s in self.all_sprites:
+                s.kill()
+        if seed is None:
+            # Restarts draw their seed from the previous run so a recorded session replays whole
+            seed = self.rng.getrandbits(32) if hasattr(self, "rng") else random.getrandbits(32)
+        self.seed = seed
+        self.rng = random.Random(seed)
         self.boss_fight_active = False
         self.next_boss_score = 10000
         
@@ -690,28 +2245,47 @@ class Game:
         self.hmg_pickup_msg_timer = 0
 
         self.boss_cooldown = 0 
+        self.boss_kills = 0
         
         self.max_distance = 100.0 
         self.distance_accumulator = 0.0
 
         self.all_sprites = pygame.sprite.Group()
         self.platforms = pygame.sprite.Group()
-        self.bullets = pygame.sprite.Group()
-        self.enemy_bullets = pygame.sprite.Group()
+        self.projectiles = ProjectileStore(miss_callback=self.apply_miss_penalty)
         self.missiles = pygame.sprite.Group()
-        self.enemies = pygame.sprite.Group()
-        self.boss_group = pygame.sprite.Group() 
+        self.enemies = SpatialGroup()
+        self.boss_group = SpatialGroup()
         self.grenades = pygame.sprite.Group()
         self.enemy_grenades = pygame.sprite.Group() 
         self.items = pygame.sprite.Group()
         self.effects = pygame.sprite.Group() 
+        self.lifecycle = ProjectileLifecycle(self.projectiles, self.missiles, self.grenades, self.enemy_grenades)
 
         self.player = Player(self) 
         self.all_sprites.add(self.player)
+        self.player_group = SpatialGroup()
+        self.player_group.add(self.player)
         
         self.camera_x = 0
+        self.prev_camera_x = 0
+        self.prev_positions = {}
         self.world_limit = 0
-        self.generate_chunk(0, 1000)
+        self.platform_grid = PlatformGrid()
+        self.chunks = ChunkManager(self.platform_grid)
+        if getattr(self, "planner", None):
+            self.planner.stop()
+        self.planner = ChunkPlanner(seed)
+        self.next_chunk = None
+        self.generate_chunk()
+
+    def pool_stats(self):
+        return {
+            "bullet": self.projectiles.stats(),
+            "grenade": Grenade.pool.stats(),
+            "explosion": Explosion.pool.stats(),
+            "melee": MeleeEffect.pool.stats(),
+        }
 
     def apply_miss_penalty(self, amount):
         if self.game_state == "playing":
@@ -725,97 +2299,89 @@ class Game:
         if self.game_state == "playing":
             self.score += int(amount) 
 
-    def generate_chunk(self, start_x, width):
+    def build_ahead(self, budget):
+        # Spends spare frame time building the next planned chunk so committing it later is cheap
+        if self.next_chunk is None:
+            layout = self.planner.next(block=False)
+            if layout is None:
+                return
+            self.next_chunk = ChunkBuilder(layout, self.rng)
+        self.next_chunk.pump(budget)
+
+    def generate_chunk(self):
+        # The commit point is fixed by the simulation; whatever build_ahead() has not built yet is built here
+        builder = self.next_chunk or ChunkBuilder(self.planner.next(), self.rng)
+        self.next_chunk = None
+        builder.finish()
+        chunk = self.chunks.attach(builder.chunk)
+        enemies = builder.enemies
         if self.boss_fight_active:
-            ground_y = SCREEN_HEIGHT - 60
-            ground = Platform(start_x, ground_y, width, 100)
-            self.platforms.add(ground)
-            self.all_sprites.add(ground)
-            self.world_limit = start_x + width
-            return
-
-        ground_y = SCREEN_HEIGHT - 60
-        ground = Platform(start_x, ground_y, width, 100)
-        self.platforms.add(ground)
-        self.all_sprites.add(ground)
-
-        num_obstacles = width // 300
-        for i in range(num_obstacles):
-            obs_w = random.randint(80, 180)
-            obs_h = random.choice([40, 80, 110])
-            obs_x = start_x + random.randint(100, width - 400) 
-            obs_y = ground_y - obs_h
-            
-            p = Platform(obs_x, obs_y, obs_w, obs_h)
-            self.platforms.add(p)
-            self.all_sprites.add(p)
-
-            roll = random.random()
-            if roll < 0.4:
-                e = Soldier(obs_x + obs_w//2, obs_y - 10)
-                self.enemies.add(e)
-                self.all_sprites.add(e)
-            elif roll < 0.6:
-                t = Tank(obs_x + 200, ground_y - 10)
-                self.enemies.add(t)
-                self.all_sprites.add(t)
-            elif roll < 0.8:
-                h = Helicopter(obs_x, 150)
-                self.enemies.add(h)
-                self.all_sprites.add(h)
-        self.world_limit = start_x + width
+            # Boss arenas stay flat, the planned obstacles and enemies are dropped
+            chunk.platforms = [builder.ground]
+            chunk.bake_terrain()
+            enemies = []
+
+        # Platforms collide through platform_grid and draw through the chunk terrain, not all_sprites
+        for platform in chunk.platforms:
+            self.platforms.add(platform)
+            self.platform_grid.add(platform)
+            chunk.sprites.append(platform)
+        for e in enemies:
+            self.enemies.add(e)
+            self.all_sprites.add(e)
+            chunk.sprites.append(e)
+        self.world_limit = chunk.end_x
 
     def spawn_loot(self, enemy):
+        rng = self.rng
+        drops = []
         if enemy.type_name == 'boss_heli':
             for _ in range(3):
-                offset = random.randint(-30, 30)
-                if random.random() < 0.5:
-                    item = MachineGunPickup(enemy.rect.centerx + offset, enemy.rect.centery)
+                offset = rng.randint(-30, 30)
+                if rng.random() < 0.5:
+                    drops.append(MachineGunPickup(enemy.rect.centerx + offset, enemy.rect.centery))
                 else:
-                    item = HealthPack(enemy.rect.centerx + offset, enemy.rect.centery)
-                self.items.add(item)
-                self.all_sprites.add(item)
+                    drops.append(HealthPack(enemy.rect.centerx + offset, enemy.rect.centery))
         
         elif enemy.type_name == 'soldier':
-            if random.random() < 0.25:
-                item = HealthPack(enemy.rect.centerx, enemy.rect.centery)
-                self.items.add(item)
-                self.all_sprites.add(item)
+            if rng.random() < 0.25:
+                drops.append(HealthPack(enemy.rect.centerx, enemy.rect.centery))
         elif enemy.type_name in ['tank', 'heli']:
-            if random.random() < 0.25:
-                item = MachineGunPickup(enemy.rect.centerx, enemy.rect.centery)
-                self.items.add(item)
-                self.all_sprites.add(item)
+            if rng.random() < 0.25:
+                drops.append(MachineGunPickup(enemy.rect.centerx, enemy.rect.centery))
+
+        for item in drops:
+            self.items.add(item)
+            self.all_sprites.add(item)
+            self.chunks.adopt(item)
 
     def trigger_explosion(self, grenade):
-        expl = Explosion(grenade.rect.centerx, grenade.rect.centery)
+        expl = Explosion.pool.acquire(grenade.rect.centerx, grenade.rect.centery)
         self.all_sprites.add(expl)
         self.effects.add(expl)
         EXPLOSION_RADIUS = 300
         EXPLOSION_DAMAGE = 120 
 
-        for e in self.enemies:
-            dist = math.hypot(e.rect.centerx - grenade.rect.centerx, e.rect.centery - grenade.rect.centery)
-            if dist < EXPLOSION_RADIUS:
-                e.hp -= EXPLOSION_DAMAGE
-                self.add_score(e.hit_score) 
-                if e.hp <= 0:
-                    self.spawn_loot(e)
-                    self.add_score(e.score_val)
-                    e.kill()
+        cx, cy = grenade.rect.center
+        for e in self.enemies.circle(cx, cy, EXPLOSION_RADIUS):
+            e.hp -= EXPLOSION_DAMAGE
+            self.add_score(e.hit_score) 
+            if e.hp <= 0:
+                self.spawn_loot(e)
+                self.add_score(e.score_val)
+                e.kill()
         
-        for b in self.boss_group:
-            dist = math.hypot(b.rect.centerx - grenade.rect.centerx, b.rect.centery - grenade.rect.centery)
-            if dist < EXPLOSION_RADIUS:
-                b.hp -= EXPLOSION_DAMAGE
-                self.add_score(b.hit_score)
-                if b.hp <= 0:
-                    self.spawn_loot(b)
-                    self.add_score(b.score_val)
-                    b.kill()
-                    self.boss_fight_active = False 
-                    self.next_boss_score += 10000
-                    self.boss_cooldown = 10**6
+        for b in self.boss_group.circle(cx, cy, EXPLOSION_RADIUS):
+            b.hp -= EXPLOSION_DAMAGE
+            self.add_score(b.hit_score)
+            if b.hp <= 0:
+                self.spawn_loot(b)
+                self.add_score(b.score_val)
+                b.kill()
+                self.boss_fight_active = False 
+                self.boss_kills += 1
+                self.next_boss_score += 10000
+                self.boss_cooldown = 10**6
 
         grenade.kill()
 
@@ -823,6 +2389,8 @@ class Game:
         if self.game_state == "game_over":
             return
         
+        prof = self.profiler
+        prof.begin()
         current_x = self.player.rect.centerx
         
         if current_x > self.max_distance:
@@ -840,7 +2408,7 @@ class Game:
         if self.score >= self.next_boss_score and not self.boss_fight_active and self.boss_cooldown <= 0:
             self.boss_fight_active = True
             boss_spawn_x = self.camera_x + SCREEN_WIDTH - 200
-            boss = BossHelicopter(boss_spawn_x, 200)
+            boss = BossHelicopter(boss_spawn_x, 200, self.rng)
             self.boss_group.add(boss)
             self.all_sprites.add(boss)
             
@@ -854,69 +2422,80 @@ class Game:
             self.camera_x += (target_cam - self.camera_x) * 0.1
 
         if self.player.rect.right > self.world_limit - SCREEN_WIDTH:
-            self.generate_chunk(self.world_limit, 1200)
-
-        self.player.get_input(self.all_sprites, self.bullets, self.grenades, self.battle_lock, self.camera_x)
-        self.player.update(self.platforms)
+            self.generate_chunk()
+        self.chunks.unload_behind(self.camera_x)
+        prof.lap("update.world")
+
+        self.player.get_input(self.all_sprites, self.projectiles, self.grenades, self.battle_lock, self.camera_x)
+        prof.lap("update.input")
+        self.player.update(self.platform_grid)
+        self.player_group.refile((self.player,))
         self.player.check_auto_melee(self.enemies, self.all_sprites, self.effects, self.spawn_loot, self.add_score)
         self.player.check_auto_melee(self.boss_group, self.all_sprites, self.effects, self.spawn_loot, self.add_score)
+        prof.lap("update.player")
         
-        self.bullets.update()
+        self.projectiles.update()
         self.grenades.update()
         self.enemy_grenades.update() 
-        self.enemy_bullets.update()
         self.missiles.update() 
-        self.items.update(self.platforms)
+        self.lifecycle.update(self.camera_x)
+        self.items.update(self.platform_grid)
         self.effects.update()
+        prof.lap("update.projectiles")
         
         for g in self.grenades:
             if g.explode_now:
                 self.trigger_explosion(g)
 
-        g_hits = pygame.sprite.groupcollide(self.enemies, self.grenades, False, False)
+        g_hits = self.enemies.groupcollide(self.grenades)
         for e, g_list in g_hits.items():
             for g in g_list: self.trigger_explosion(g) 
             
-        g_boss_hits = pygame.sprite.groupcollide(self.boss_group, self.grenades, False, False)
+        g_boss_hits = self.boss_group.groupcollide(self.grenades)
         for b, g_list in g_boss_hits.items():
             for g in g_list: self.trigger_explosion(g)
 
-        ground_hits = pygame.sprite.groupcollide(self.grenades, self.platforms, False, False)
+        ground_hits = self.platform_grid.groupcollide(self.grenades)
         for g, plats in ground_hits.items():
             g.explode_now = True
 
-        enemy_ground_hits = pygame.sprite.groupcollide(self.enemy_grenades, self.platforms, False, False)
+        enemy_ground_hits = self.platform_grid.groupcollide(self.enemy_grenades)
         for g, plats in enemy_ground_hits.items():
             g.explode_now = True
 
         for g in self.enemy_grenades:
             if g.explode_now:
-                expl = Explosion(g.rect.centerx, g.rect.centery)
+                expl = Explosion.pool.acquire(g.rect.centerx, g.rect.centery)
                 self.all_sprites.add(expl)
                 self.effects.add(expl)
                 
-                dist_p = math.hypot(self.player.rect.centerx - g.rect.centerx, self.player.rect.centery - g.rect.centery)
-                if dist_p < 150: 
+                if self.player_group.circle(g.rect.centerx, g.rect.centery, 150): 
                     self.player.take_damage(30)
                 g.kill()
         
         bg_hits = pygame.sprite.spritecollide(self.player, self.enemy_grenades, False)
         for g in bg_hits:
             g.explode_now = True 
+        prof.lap("update.explosions")
 
-        for e in self.enemies:
-            if -SCREEN_WIDTH < e.rect.x - self.player.rect.x < SCREEN_WIDTH * 1.5:
-                e.update(self.platforms, self.player, self.enemy_bullets, self.all_sprites, 
-                         missiles_group=self.missiles, grenades_group=self.enemy_grenades, bullet_img=self.heli_bullet_img)
+        # Enemies outside the window sleep until the player gets close
+        behind, ahead = self.enemy_wake
+        awake = self.enemies.window(self.player.rect.x - SCREEN_WIDTH * behind, self.player.rect.x + SCREEN_WIDTH * ahead)
+        for e in awake:
+            e.update(self.platform_grid, self.player, self.projectiles, self.all_sprites, 
+                     missiles_group=self.missiles, grenades_group=self.enemy_grenades, bullet_img=self.heli_bullet_img)
+        self.enemies.refile(awake)
 
         for b in self.boss_group:
-            b.update(self.platforms, self.player, self.enemy_bullets, self.all_sprites, 
+            b.update(self.platform_grid, self.player, self.projectiles, self.all_sprites, 
                      missiles_group=self.missiles, grenades_group=self.enemy_grenades)
+        self.boss_group.refile(self.boss_group)
+        prof.lap("update.enemies")
 
-        hits = pygame.sprite.groupcollide(self.enemies, self.bullets, False, True)
-        for e, b_list in hits.items():
-            for b in b_list:
-                e.hp -= b.damage
+        hits = self.projectiles.collide_group(self.enemies)
+        for e, damages in hits.items():
+            for damage in damages:
+                e.hp -= damage
                 self.add_score(e.hit_score) 
             
             if e.hp <= 0: 
@@ -925,10 +2504,10 @@ class Game:
                 e.kill()
         
         # Player vs Boss
-        boss_hits = pygame.sprite.groupcollide(self.boss_group, self.bullets, False, True)
-        for boss_enemy, bullet_list in boss_hits.items():
-            for bullet in bullet_list:
-                boss_enemy.hp -= bullet.damage
+        boss_hits = self.projectiles.collide_group(self.boss_group)
+        for boss_enemy, damages in boss_hits.items():
+            for damage in damages:
+                boss_enemy.hp -= damage
                 self.add_score(boss_enemy.hit_score)
             
             if boss_enemy.hp <= 0:
@@ -936,18 +2515,20 @@ class Game:
                 self.add_score(boss_enemy.score_val)
                 boss_enemy.kill()                
                 self.boss_fight_active = False
+                self.boss_kills += 1
                 self.next_boss_score += 10000
                 self.boss_cooldown = 10**6
         
-        missile_hits = pygame.sprite.groupcollide(self.missiles, self.bullets, True, True) 
+        missile_hits = self.projectiles.collide_group(self.missiles, dokill_group=True)
 
-        player_hit_list = pygame.sprite.spritecollide(self.player, self.enemy_bullets, True)
-        for bullet in player_hit_list:
-            self.player.take_damage(bullet.damage)
+        player_hit_list = self.projectiles.collide_sprite(self.player)
+        for damage in player_hit_list:
+            self.player.take_damage(damage)
             
         missile_hit_player = pygame.sprite.spritecollide(self.player, self.missiles, True)
         for m in missile_hit_player:
             self.player.take_damage(m.damage)
+        prof.lap("update.collisions")
 
         item_hits = pygame.sprite.spritecollide(self.player, self.items, True)
         for item in item_hits:
@@ -964,140 +2545,311 @@ class Game:
             self.game_state = "game_over"
             if self.score > self.highscore:
                 self.highscore = self.score
-                self.save_high_score()
+            if self.leaderboard:
+                self.leaderboard.submit(self.score, self.max_distance)
         
         if self.hmg_pickup_msg_timer > 0:
             self.hmg_pickup_msg_timer -= 1 * DT
             
         if self.boss_cooldown > 0:
             self.boss_cooldown -= 1 * DT
+        prof.lap("update.items")
 
     def handle_input(self):
+        pressed = []
         for event in pygame.event.get():
             if event.type == pygame.QUIT: self.running = False
             
             if event.type == pygame.KEYDOWN:
-                if self.game_state == "playing":
-                    if event.key == pygame.K_f and self.player.weapon_type == "pistol" and not self.player.is_shielding:
-                        self.player.fire_bullet(self.bullets, self.all_sprites)
-                    if event.key == pygame.K_F1: 
-                        for e in self.enemies: e.kill()
-                        for b in self.boss_group: b.kill(); self.boss_fight_active = False
-                
-                elif self.game_state == "game_over":
-                    if event.key == pygame.K_r:
-                        self.new_game()
-                    if event.key == pygame.K_ESCAPE:
-                        self.running = False
+                if event.key == pygame.K_F3:
+                    self.toggle_profiler()
+                else:
+                    pressed.append(event.key)
+        return pressed
+
+    def apply_quality(self):
+        stride, simple_melee, max_scale, wake = self.governor.settings
+        Explosion.stride = stride
+        MeleeEffect.simple = simple_melee
+        self.enemy_wake = wake
+        scale = min(max_scale, self.base_scale)
+        if scale != self.view.scale:
+            self.view.set_scale(scale)
+
+    def toggle_profiler(self):
+        self.show_profiler = not self.show_profiler
+        if self.profiler.rows is None:
+            self.profiler.enable(self.show_profiler)
+
+    def handle_keydown(self, key):
+        if self.game_state == "playing":
+            if key == pygame.K_f and self.player.weapon_type == "pistol" and not self.player.is_shielding:
+                self.player.fire_bullet(self.projectiles)
+            if key == pygame.K_F1: 
+                for e in self.enemies: e.kill()
+                for b in self.boss_group: b.kill(); self.boss_fight_active = False
+        
+        elif self.game_state == "game_over":
+            if key == pygame.K_r:
+                self.new_game()
+            if key == pygame.K_ESCAPE:
+                self.running = False
+
+    def snapshot(self):
+        # Start-of-tick centres, draw() interpolates from these; centres stay put when a sprite's image
+        # changes size (explosion frames, rotated missiles) where the top-left corner would jump
+        self.prev_camera_x = self.camera_x
+        self.prev_positions = {s: (*s.rect.center, getattr(s, "generation", 0)) for s in self.all_sprites}
+
+    def step(self, keys, pressed=()):
+        if self.recorder is not None:
+            self.recorder.record(keys, pressed)
+        self.snapshot()
+        self.keys = keys
+        for key in pressed:
+            self.handle_keydown(key)
+        self.update()
+        if self.telemetry is not None:
+            self.telemetry.tick(self)
+
+    def state_hash(self):
+        # Fingerprint of everything a replay has to reproduce exactly
+        p = self.player
+        store = self.projectiles
+        state = (self.seed, self.rng.getstate(), self.game_state, self.score, self.max_distance, self.camera_x,
+                 p.pos_x, p.pos_y, p.hp, p.shield, p.weapon_type, p.ammo,
+                 [(type(s).__name__, s.rect.topleft) for s in self.all_sprites],
+                 [(e.type_name, e.hp) for e in self.enemies], [b.hp for b in self.boss_group])
+        digest = hashlib.blake2b(repr(state).encode(), digest_size=16)
+        for column in (store.x, store.y, store.vx, store.vy):
+            digest.update(column[store.alive].tobytes())
+        return digest.digest()
+
+    def draw_profiler_overlay(self):
+        summary = self.profiler.summary()
+        lines = [f"{'phase':<20}{'avg ms':>8}{'max ms':>8}"]
+        for phase, (avg, peak) in summary.items():
+            lines.append(f"{phase:<20}{avg:>8.3f}{peak:>8.3f}")
+        if self.view.dynamic or self.governor:
+            lines.append(f"render scale {self.view.scale:.2f} ({self.view.canvas.get_width()}px)")
+        governor = self.governor
+        if governor:
+            stride, simple_melee, _, (behind, ahead) = governor.settings
+            lines.append(f"quality L{governor.level} avg {governor.avg_ms or 0.0:.2f}/{governor.budget_ms:.2f} ms")
+            lines.append(f"  expl x{stride} melee {'simple' if simple_melee else 'full'} wake {behind:g}/{ahead:g}")
+            for frame, before, after, avg in governor.history:
+                lines.append(f"  f{frame}: L{before} -> L{after} at {avg:.2f} ms")
+        if self.telemetry and self.telemetry.samples:
+            first, last = self.telemetry.samples[0], self.telemetry.samples[-1]
+            lines.append(f"telemetry {len(self.telemetry.samples)} samples over {last['t'] - first['t']:.0f}s")
+            lines.append(f"  sprites {first['groups']['all_sprites']} -> {last['groups']['all_sprites']}  "
+                         f"surfaces {first['surface_bytes'] / 2**20:.1f} -> {last['surface_bytes'] / 2**20:.1f} MiB")
+            lines.append(f"  traced {first['traced_bytes'] / 2**20:.1f} -> {last['traced_bytes'] / 2**20:.1f} MiB")
+        rendered = [self.font.render(line, True, WHITE) for line in lines]
+        width = max(300, max(r.get_width() for r in rendered) + 16)
+        panel = pygame.Surface((width, 22 * len(lines) + 10), pygame.SRCALPHA)
+        panel.fill(SEMI_TRANSPARENT_BLACK)
+        for i, line in enumerate(rendered):
+            panel.blit(line, (8, 5 + 22 * i))
+        return [self.view.blit(self.view.canvas, panel, (SCREEN_WIDTH - width - 20, 40), smooth=True)]
 
     def draw_game_over_screen(self):
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        overlay.fill(SEMI_TRANSPARENT_BLACK)
-        self.screen.blit(overlay, (0,0))
-        
-        title_surf = self.title_font.render("GAME OVER", True, RED)
+        view = self.view
+        canvas = view.canvas
+        if self.game_over_overlay is None:
+            self.game_over_overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+            self.game_over_overlay.fill(SEMI_TRANSPARENT_BLACK)
+        view.blit(canvas, self.game_over_overlay, (0, 0))
+        text = self.hud.text
+        
+        title_surf = text.render(self.title_font, "GAME OVER", RED)
         title_rect = title_surf.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT/2 - 100))
-        self.screen.blit(title_surf, title_rect)
+        view.blit(canvas, title_surf, title_rect.topleft, smooth=True)
         
-        score_surf = self.big_font.render(f"Score: {self.score}", True, WHITE)
+        score_surf = text.render(self.big_font, f"Score: {self.score}", WHITE)
         score_rect = score_surf.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT/2 - 20))
-        self.screen.blit(score_surf, score_rect)
+        view.blit(canvas, score_surf, score_rect.topleft, smooth=True)
         
         hs_color = GOLD if self.score >= self.highscore and self.score > 0 else GREY
-        hs_surf = self.font.render(f"Best Score: {self.highscore}", True, hs_color)
+        hs_surf = text.render(self.font, f"Best Score: {self.highscore}", hs_color)
         hs_rect = hs_surf.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT/2 + 20))
-        self.screen.blit(hs_surf, hs_rect)
+        view.blit(canvas, hs_surf, hs_rect.topleft, smooth=True)
         
-        restart_surf = self.font.render("Press [R] to Restart  |  Press [ESC] to Exit", True, WHITE)
+        restart_surf = text.render(self.font, "Press [R] to Restart  |  Press [ESC] to Exit", WHITE)
         restart_rect = restart_surf.get_rect(center=(SCREEN_WIDTH/2, SCREEN_HEIGHT/2 + 80))
-        self.screen.blit(restart_surf, restart_rect)
-
-    def draw(self):
-        self.screen.fill(BLACK)
-        
+        view.blit(canvas, restart_surf, restart_rect.topleft, smooth=True)
+        return [canvas.get_rect()]
+
+    def draw(self, alpha=1.0):
+        prof = self.profiler
+        prof.begin()
+        renderer = self.renderer
+        view = self.view
+        canvas = view.canvas
+        if renderer.screen is not canvas:
+            renderer.set_canvas(canvas)
+        
+        # alpha is how far the render time sits between the last two ticks
+        camera_x = int(self.prev_camera_x + (self.camera_x - self.prev_camera_x) * alpha)
+        prev_positions = self.prev_positions if alpha < 1.0 else {}
+        renderer.begin(camera_x)
+        items = [(c, view.image(c.terrain), view.pos(c.terrain_rect.x - camera_x, c.terrain_rect.y))
+                 for c in self.chunks.visible(camera_x - 50, camera_x + SCREEN_WIDTH + 50)]
+        shields = []
         for s in self.all_sprites:
-            off_x = s.rect.x - int(self.camera_x)
+            x, y = s.rect.topleft
+            prev = prev_positions.get(s)
+            # A pooled sprite reacquired during the tick starts where it is, not where its last life ended
+            if prev and prev[2] == getattr(s, "generation", 0):
+                cx, cy = s.rect.center
+                x = int(prev[0] + (cx - prev[0]) * alpha) - s.rect.width // 2
+                y = int(prev[1] + (cy - prev[1]) * alpha) - s.rect.height // 2
+            off_x = x - camera_x
             if (off_x + s.rect.width > -50) and (off_x < SCREEN_WIDTH + 50):
-                self.screen.blit(s.image, (off_x, s.rect.y))
+                items.append((s, view.image(s.image), view.pos(off_x, y)))
                 if isinstance(s, Player) and s.is_shielding:
-                    pygame.draw.circle(self.screen, CYAN, (off_x + 15, s.rect.y + 25), 40, 2)
+                    shields.append((off_x + 15, y + 25))
+        renderer.draw_world(items)
+        for center in shields:
+            renderer.mark([pygame.draw.circle(canvas, CYAN, view.pos(*center),
+                                              max(1, round(40 * view.scale)), max(1, round(2 * view.scale)))])
+        renderer.mark(self.projectiles.draw(canvas, camera_x, alpha, view))
+        prof.lap("draw.world")
         
         if self.game_state == "playing":
-            hp_pct = max(0, self.player.hp / self.player.max_hp)
-            hp_col = (0, 255, 0) if hp_pct > 0.5 else (255, 0, 0)
-
-            pygame.draw.rect(self.screen, (50,0,0), (10, 10, 200, 20))
-            pygame.draw.rect(self.screen, hp_col, (10, 10, 200 * hp_pct, 20))
-            pygame.draw.rect(self.screen, WHITE, (10, 10, 200, 20), 2)
-
-            shield_pct = max(0, self.player.shield / self.player.max_shield)
-            shield_col = CYAN if self.player.shield > 0 else (50, 50, 50)
-
-            pygame.draw.rect(self.screen, (0,50,50), (10, 35, 150, 10))
-            pygame.draw.rect(self.screen, shield_col, (10, 35, 150 * shield_pct, 10))
-            pygame.draw.rect(self.screen, WHITE, (10, 35, 150, 10), 1)
-
-            grenade_pct = 1.0 - (max(0, self.player.grenade_cd) / self.player.max_grenade_cd)
-            grenade_col = ORANGE if grenade_pct >= 1.0 else (100, 50, 0)
-            
-            pygame.draw.rect(self.screen, (50, 25, 0), (10, 50, 100, 8))
-            pygame.draw.rect(self.screen, grenade_col, (10, 50, 100 * grenade_pct, 8))
-            pygame.draw.rect(self.screen, WHITE, (10, 50, 100, 8), 1)
-
-            g_label = self.font.render("G", True, WHITE)
-            self.screen.blit(g_label, (115, 45))
-
-            score_txt = self.font.render(f"SCORE: {self.score}", True, WHITE)
-            self.screen.blit(score_txt, (SCREEN_WIDTH - 150, 10))
-            
-            w_txt = "PISTOL"
-            w_col = WHITE
-            if self.player.weapon_type == "hmg":
-                w_txt = f"MACHINE GUN ({self.player.ammo})"
-                w_col = GOLD
-            
-            txt_weapon = self.font.render(w_txt, True, w_col)
-            self.screen.blit(txt_weapon, (10, 70))
-            
-            txt_info = self.font.render("F: Shoot (Hold for MG) | C: Shield | G: Grenade", True, GREY)
-            self.screen.blit(txt_info, (220, 10))
-
-            if self.boss_fight_active and len(self.boss_group) > 0:
-                boss = self.boss_group.sprites()[0]
-                boss_hp_pct = max(0, boss.hp / boss.max_hp)
-                
-                bar_w = 600
-                bar_h = 30
-                bar_x = (SCREEN_WIDTH - bar_w) // 2
-                bar_y = 50
-                
-                pygame.draw.rect(self.screen, BLACK, (bar_x, bar_y, bar_w, bar_h))
-                pygame.draw.rect(self.screen, PURPLE, (bar_x, bar_y, bar_w * boss_hp_pct, bar_h))
-                pygame.draw.rect(self.screen, WHITE, (bar_x, bar_y, bar_w, bar_h), 2)
-                
-                boss_label = self.big_font.render("GIANT HELICOPTER", True, RED)
-                self.screen.blit(boss_label, (bar_x, bar_y - 40))
-
-                warn = self.font.render("WARNING: BOSS APPROACHING!", True, RED)
-                self.screen.blit(warn, (SCREEN_WIDTH//2 - 120, 90))
-
-            if self.hmg_pickup_msg_timer > 0:
-                msg = self.big_font.render("HEAVY MACHINE GUN!", True, GOLD)
-                self.screen.blit(msg, (SCREEN_WIDTH//2 - 200, SCREEN_HEIGHT//2 - 50))
+            renderer.mark(self.hud.draw(canvas, self, view))
 
         if self.game_state == "game_over":
-            self.draw_game_over_screen()
+            renderer.mark(self.draw_game_over_screen())
+        prof.lap("draw.hud")
 
-        pygame.display.flip()
+        if self.show_profiler:
+            renderer.mark(self.draw_profiler_overlay())
+            prof.lap("draw.overlay")
+
+        renderer.present()
+        prof.lap("draw.present")
 
     def run(self):
+        # Fixed-step simulation, rendering interpolates between the last two ticks
+        accumulator = 0.0
+        previous = time.perf_counter()
         while self.running:
-            self.handle_input()
-            self.update()
-            self.draw()
+            now = time.perf_counter()
+            accumulator += now - previous
+            previous = now
+
+            self.pending_keys.extend(self.handle_input())
+            steps = 0
+            while accumulator >= TICK_SECONDS and steps < MAX_CATCHUP_STEPS:
+                self.step(pygame.key.get_pressed(), self.pending_keys)
+                self.pending_keys = []
+                accumulator -= TICK_SECONDS
+                steps += 1
+            if steps == MAX_CATCHUP_STEPS and accumulator >= TICK_SECONDS:
+                # Too far behind to catch up, drop the backlog instead of spiralling
+                accumulator %= TICK_SECONDS
+
+            self.draw(accumulator / TICK_SECONDS)
+            frame_ms = (time.perf_counter() - now) * 1000
+            self.view.observe(frame_ms)
+            if self.governor and self.governor.observe(frame_ms):
+                self.apply_quality()
+            self.build_ahead(CHUNK_BUILD_BUDGET_MS / 1000)
+            self.profiler.lap("build_ahead")
+            self.profiler.end_frame()
             self.clock.tick(FPS)
+        if self.leaderboard:
+            self.leaderboard.close()
         pygame.quit()
         sys.exit()
 
+    def run_headless(self, input_source, ticks, stop_on_game_over=True):
+        # Logic only: no draw(), no window and no frame cap
+        start = time.perf_counter()
+        done = 0
+        while done < ticks and self.running:
+            keys, pressed = input_source.poll()
+            self.step(keys, pressed)
+            self.profiler.end_frame()
+            done += 1
+            if stop_on_game_over and self.game_state == "game_over":
+                break
+        elapsed = time.perf_counter() - start
+        return {
+            "ticks": done,
+            "seconds": elapsed,
+            "ticks_per_second": done / elapsed if elapsed > 0 else 0.0,
+            "score": self.score,
+            "distance": self.max_distance,
+            "game_over": self.game_state == "game_over",
+        }
+
 if __name__ == "__main__":
-    Game().run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Metal Slug: Clone")
+    parser.add_argument("--headless", action="store_true", help="simulate without a window or frame cap")
+    parser.add_argument("--ticks", type=int, default=100000, help="ticks to simulate in headless mode")
+    parser.add_argument("--profile-out", help="record per-frame phase timings to this .csv or .json file")
+    parser.add_argument("--renderer", choices=sorted(RENDERERS), default="full",
+                        help="full: fill and flip every frame, dirty: update changed rects only while the camera "
+                             "holds still (boss fights, standing); any scroll is a full redraw")
+    parser.add_argument("--resolution", metavar="WxH", help=f"internal render size, e.g. 1280x720 "
+                        f"(default {SCREEN_WIDTH}x{SCREEN_HEIGHT}), scaled up to the window once per frame")
+    parser.add_argument("--dynamic-resolution", action="store_true",
+                        help="lower the internal resolution while frames run over budget")
+    parser.add_argument("--adaptive-quality", action="store_true",
+                        help="trade explosion frames, melee effects, resolution and off-screen enemy updates "
+                             "for frame time while frames run over budget")
+    parser.add_argument("--seed", type=int, help="world seed (default: random)")
+    parser.add_argument("--record", metavar="PATH", help="save the seed and every tick's input to a replay file")
+    parser.add_argument("--telemetry", metavar="PATH", help="append sprite counts, surface memory and "
+                        "tracemalloc top allocators to this JSON lines file (slows the game while tracing)")
+    parser.add_argument("--replay", metavar="PATH", help="replay a recording headless and check it ends in the recorded state")
+    args = parser.parse_args()
+    render_scale = 1.0
+    if args.resolution:
+        try:
+            width, height = (int(v) for v in args.resolution.lower().split("x"))
+        except ValueError:
+            parser.error(f"--resolution expects WxH, got {args.resolution!r}")
+        if not 0 < width <= SCREEN_WIDTH or width * SCREEN_HEIGHT != height * SCREEN_WIDTH:
+            parser.error(f"--resolution must keep the {SCREEN_WIDTH}x{SCREEN_HEIGHT} aspect ratio and not exceed it")
+        render_scale = width / SCREEN_WIDTH
+
+    if args.replay:
+        replay = Replay.load(args.replay)
+        game = Game(headless=True, renderer=args.renderer, seed=replay.seed)
+        result = game.run_headless(replay, len(replay), stop_on_game_over=False)
+        matched = game.state_hash() == replay.state_hash
+        print(f"replayed {result['ticks']} ticks in {result['seconds']:.2f}s "
+              f"({result['ticks_per_second']:.0f} ticks/s), score {result['score']}, "
+              f"final state {'matches' if matched else 'DIFFERS from'} the recording")
+        pygame.quit()
+        sys.exit(0 if matched else 1)
+
+    if args.adaptive_quality and args.record:
+        # Lower levels wake fewer enemies, which a headless replay could not reproduce
+        parser.error("--adaptive-quality changes the simulation and cannot be combined with --record")
+    game = Game(headless=args.headless, renderer=args.renderer, render_scale=render_scale,
+                dynamic_resolution=args.dynamic_resolution, adaptive_quality=args.adaptive_quality, seed=args.seed)
+    if args.profile_out:
+        game.profiler.record()
+    if args.record:
+        game.recorder = InputRecorder(game.seed)
+    if args.telemetry:
+        game.telemetry = TelemetryRecorder(args.telemetry)
+    try:
+        if args.headless:
+            result = game.run_headless(ScriptedInput(autorun_script), args.ticks)
+            print(f"{result['ticks']} ticks in {result['seconds']:.2f}s "
+                  f"({result['ticks_per_second']:.0f} ticks/s), score {result['score']}")
+            pygame.quit()
+        else:
+            game.run()
+    finally:
+        if args.profile_out:
+            game.profiler.export(args.profile_out)
+        if args.telemetry:
+            game.telemetry.flush()
+        if args.record:
+            game.recorder.save(args.record, game.state_hash())